@@ -2,8 +2,9 @@
 # animation.py 
 #
 # Functions to create animation capture instructions.
-# Instructions are executable python strings to modify entities and are
-# captured in the script of a Scene object. 
+# Instructions are executable python strings or callables taking the scene,
+# which modify entities and are captured in the script of a Scene object. 
+# Attribute sweeps are captured as a list of per-frame values (Scene.sweeps).
 #
 
 from . import funcs
@@ -17,7 +18,7 @@ def pause(scene, duration):
         duration: Time in seconds for event to last. Use -1 for one frame. 
     """
     nframes = max(1, int(duration * scene.fps))
-    scene.add_instruction(max(scene.script.keys()) + nframes, "")
+    scene.add_instruction(scene.end_frame() + nframes, "")
 
 def slide(scene, duration, entity_alias, slide_disp=[0, 0, 0], 
         profile="sigmoid", t_start=-1): # TODO Rotation
@@ -38,19 +39,20 @@ def slide(scene, duration, entity_alias, slide_disp=[0, 0, 0],
     values = funcs.span(np.zeros(3), np.array(slide_disp), nframes, profile)
     
     if t_start == -1: # append to end
-        frame_start = max(scene.script.keys())
+        frame_start = scene.end_frame()
     else:
         frame_start = int(t_start * scene.fps)
         
     if len(values) == 1:  # e.g. duration is -1; apply at frame start 
         scene.add_instruction(frame_start,
-            "self.entities[\"%s\"].move(dpos=%s)" 
-            % (entity_alias, list(values[0])))
+            lambda scene, alias=entity_alias, dpos=values[0]:
+                scene.entities[alias].move(dpos=dpos))
     else:
-        for i in range(1, len(values)):
+        deltas = np.diff(values, axis=0)
+        for i, delta in enumerate(deltas, 1):
             scene.add_instruction(frame_start + i,
-                "self.entities[\"%s\"].move(dpos=%s)" 
-                % (entity_alias, list(values[i] - values[i-1])))
+                lambda scene, alias=entity_alias, dpos=delta:
+                    scene.entities[alias].move(dpos=dpos))
 
 def slide_to(scene, duration, entity_alias, slide_pos=[0, 0, 0], 
         profile="sigmoid", t_start=-1): # TODO Rotation; handle other local csys
@@ -71,21 +73,62 @@ def slide_to(scene, duration, entity_alias, slide_pos=[0, 0, 0],
     values = funcs.span(0, 1, nframes, profile)
     
     if t_start == -1: # append to end
-        frame_start = max(scene.script.keys())
+        frame_start = scene.end_frame()
     else:
         frame_start = int(t_start * scene.fps)
         
     if len(values) == 1:  # e.g. duration is -1; apply at frame start 
         scene.add_instruction(frame_start,
-            "self.entities[\"%s\"].move(pos=%s)" 
-            % (entity_alias, list(slide_pos)))
+            lambda scene, alias=entity_alias, pos=list(slide_pos):
+                scene.entities[alias].move(pos=pos))
     else:
-        for i in range(1, len(values)):
-            scene.add_instruction(frame_start + i, (
-                "self.entities[\"%s\"].move(dpos=(np.array(%s) - " +  
-                "self.entities[\"%s\"].pos()) * (%s))")
-                % (entity_alias, list(slide_pos), entity_alias, 
-                (values[i] - values[i-1]) / (values[-1] - values[i-1])))
+        # Fraction of the remaining distance to cover at each frame
+        values = values.ravel()
+        weights = (np.diff(values) / (values[-1] - values[:-1])).tolist()
+        slide_pos = np.array(slide_pos)
+        for i, weight in enumerate(weights, 1):
+            scene.add_instruction(frame_start + i,
+                lambda scene, alias=entity_alias, weight=weight:
+                    scene.entities[alias].move(
+                        dpos=(slide_pos - scene.entities[alias].pos()) * weight))
+
+def rotate(scene, duration, entity_alias, axis=[0, 0, 1], angle=0, 
+        profile="sigmoid", t_start=-1):
+    """ Rotates the entity (relative) about an axis through its origin, and 
+    adds motion to scene instructions. The rotation matrices for every frame
+    are calculated together when the instructions are added.
+    
+    Args:
+        scene        (Scene)    Scene object whose script will be appended to.
+        duration     (float)    Seconds for event to last. Use -1 for one frame.
+        entity_alias (string)   Alias for Entity object whose attribute is to be 
+                                changed.
+        axis         (list)     3-element list or shape (3) numpy array.
+                                Rotation axis, in the entity's parent csys. 
+        angle        (float)    Total counter-clockwise rotation, rad.
+        profile      (string)   Transition profile shape, see funcs.span.
+        t_start      (float)    Time in seconds to begin attribute transition.
+                                Use -1 to append to end of last instruction.
+    """
+    nframes = max(1, int(duration * scene.fps))
+    values = funcs.span(0, angle, nframes, profile).ravel()
+    
+    if t_start == -1: # append to end
+        frame_start = scene.end_frame()
+    else:
+        frame_start = int(t_start * scene.fps)
+        
+    if len(values) == 1:  # e.g. duration is -1; apply at frame start 
+        scene.add_instruction(frame_start,
+            lambda scene, alias=entity_alias, 
+                    dori=funcs.rotation_matrices(axis, values[0]):
+                scene.entities[alias].move(dori=dori))
+    else:
+        rotations = funcs.rotation_matrices(axis, np.diff(values))
+        for i, rotation in enumerate(rotations, 1):
+            scene.add_instruction(frame_start + i,
+                lambda scene, alias=entity_alias, dori=rotation:
+                    scene.entities[alias].move(dori=dori))
 
 def sweep_cmd(scene, duration, cmd, t_start=-1):
     """ Repeats a command as an instruction for each frame in a given interval.
@@ -99,7 +142,7 @@ def sweep_cmd(scene, duration, cmd, t_start=-1):
     """
     nframes = max(1, int(duration * scene.fps))
     if t_start == -1: # append to end
-        frame_start = max(scene.script.keys())
+        frame_start = scene.end_frame()
     else:
         frame_start = int(t_start * scene.fps)
     for i in range(nframes):
@@ -134,16 +177,15 @@ def sweep_attr(scene, duration, entity_alias, attribute, start, end,
     """
     nframes = max(1, int(duration * scene.fps))
     values = funcs.span(start, end, nframes, profile)
+    if np.ndim(start) == 0 and np.ndim(end) == 0: # scalar attribute
+        values = values.ravel().tolist()
     
     if t_start == -1: # append to end
-        frame_start = max(scene.script.keys())
+        frame_start = scene.end_frame()
     else:
         frame_start = int(t_start * scene.fps)
         
-    for i in range(len(values)):
-        scene.add_instruction(frame_start + i,
-            "self.entities[\"%s\"].set_attribute(\"%s\", %f)"
-            % (entity_alias, attribute, values[i]))
+    scene.add_sweep(frame_start, entity_alias, attribute, values)
 
 def set_attr(scene, entity_alias, attribute, value, t_start=-1, **kwargs):
     """ Sets the attribute of an entity to a value at the time specified.
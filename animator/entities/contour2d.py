@@ -4,7 +4,8 @@
 # A 2D contour, representing the periphery of a solid or hole.
 #
 
-from .entity import Entity
+from .entity import Entity, pixel_bbox
+from ..funcs import project, to_pixels, FLIP_Y
 ##from entity import Entity
 import numpy as np
 import cv2
@@ -17,7 +18,10 @@ class Contour2D(Entity):
         size (int): thickness of contour
     """
     
-    def __init__(self, contours=[], jaggedness=0.0, n_points=30, seed=0, 
+    # Attributes which do not affect the geometry of the contour
+    DISPLAY_ATTRIBUTES = ("opacity", "visible", "color", "size")
+    
+    def __init__(self, contours=(), jaggedness=0.0, n_points=30, seed=0, 
             **kwargs):
         """ Creates a new contour, consisting of a list of child contours. 
         
@@ -25,14 +29,48 @@ class Contour2D(Entity):
             contours (list of Contour2D): contours contained within this one
             jaggedness (float): Max distance to protrude from nominal contour
             n_points (int): Number of points to divide each sub-contour into
-            seed (int): Random seed to control jaggedness
+            seed (int): Random seed to control jaggedness. Each contour draws
+                        from its own generator, independent of the global
+                        numpy random state.
         """
+        self._jagged_points = None # cache, see jagged_points
+        self._pixel_points = None # cache, see pixel_points
         super().__init__(components=contours, **kwargs)
         self.put("jaggedness", jaggedness)
         self.put("n_points", n_points)
         self.put("seed", seed)
                 # seed ensures jaggedness always stays the same during render
     
+    def put(self, attribute, new_val):
+        """ Sets specified attribute to new value. 
+        Clears cached points if the attribute affects the contour geometry.
+        
+        See Entity.put
+        """
+        super().put(attribute, new_val)
+        if attribute not in self.DISPLAY_ATTRIBUTES:
+            self.clear_cache()
+    
+    def add_components(self, *args):
+        """ Adds child contours to this contour, and clears cached points.
+        
+        See Entity.add_components
+        """
+        super().add_components(*args)
+        self.clear_cache()
+    
+    def clear_cache(self):
+        """ Clears the cached points of this contour, and of all contours 
+        containing it, so they are recalculated on the next draw. 
+        """
+        contour = self
+        while isinstance(contour, Contour2D):
+            contour._jagged_points = None
+            contour._pixel_points = None
+            if contour.attributes["parent"] is contour: # line, arc, etc.
+                break
+            contour = contour.attributes["parent"]
+    
     def draw_self(self, img, resolution, origin): #
         """ Draws this contour on the image specified.
         
@@ -41,8 +79,7 @@ class Contour2D(Entity):
         # # for contour in self.get("components"):
             # # contour.draw_self(img, resolution, origin)
             
-        points = self.jagged_points()
-        points = np.array([origin]) + points * [1, -1] * resolution  # px
+        points = self.pixel_points(resolution, origin)
         # cv2.polylines(img,
                       # np.int32([points]),
                       # isClosed=False,
@@ -50,12 +87,17 @@ class Contour2D(Entity):
                       # thickness=self.get("size"), 
                       # lineType=cv2.LINE_AA)
         cv2.drawContours(img,
-                         np.int32([points]),
+                         [points],
                          0,
                          color=self.get("color"),
                          thickness=self.get("size"),
                          # thickness=cv2.FILLED,
                          lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this contour. See Entity.bbox """
+        return pixel_bbox(project(self.jagged_points(), resolution, origin),
+                self.attributes["size"] + 2)
                          
     def segments(self):
         """ Returns points and normals of a segmentation into n points.
@@ -65,32 +107,94 @@ class Contour2D(Entity):
                 points (np.array((n_points, 2))): Points of segmented line
                 normals (np.array((n_points, 2))): Normal vectors at each point
         """
-        points = np.zeros((0, 2))
-        normals = np.zeros((0, 2))
-        for contour in self.get("components"):
-            p, n = contour.segments()
-            points = np.vstack((points, p))
-            normals = np.vstack((normals, n))
-        return points, normals
+        segments = [contour.segments() for contour in self.get("components")]
+        if not segments:
+            return (np.zeros((0, 2), dtype=np.float32), 
+                    np.zeros((0, 2), dtype=np.float32))
+        points, normals = zip(*segments)
+        return np.concatenate(points), np.concatenate(normals)
         
     def jagged_points(self):
         """ Returns the points along the contour if it were made jagged.
+        The points are cached until the contour geometry changes, and must not
+        be modified by the caller.
         
         Returns:
             points (np.array(n_points, 2)): Array of jagged points
         """
-        np.random.seed(self.get("seed"))
+        if self._jagged_points is None:
+            self._jagged_points = self.calc_jagged_points()
+        return self._jagged_points
+        
+    def pixel_points(self, resolution, origin):
+        """ Returns the jagged points of this contour in image pixels.
+        The points are cached until the contour geometry, resolution, or origin
+        changes, and must not be modified by the caller. 
+        
+        Args:
+            resolution: (float) Pixels per mm in the image
+            origin: (2-element list) The xy pixel values of the global origin
+        
+        Returns:
+            points (np.array(n_points, 2), int32): Array of pixel points
+        """
+        key = (resolution, tuple(origin))
+        if self._pixel_points is None or self._pixel_points[0] != key:
+            # Transform a new product array in place, then cast once
+            points = np.multiply(self.jagged_points(), FLIP_Y * resolution)
+            points += origin
+            self._pixel_points = (key, points.astype(np.int32))
+        return self._pixel_points[1]
+        
+    def calc_jagged_points(self):
+        """ Calculates the points along the contour if it were made jagged.
+        See Contour2D.jagged_points
+        """
+        rng = np.random.default_rng(self.get("seed"))
+        jaggedness = self.get("jaggedness")
         points, normals = self.segments()
+        n_points = len(points)
         # Set random offsets: (initial and final points have 0 offset)
-        offsets = np.random.uniform(-self.get("jaggedness"), 
-                self.get("jaggedness"), (len(points), 1))
-        offsets[0] = [0]
-        offsets[-1] = [0]
-        # Offset points in direction of normals:
-        jagged_points = points + offsets * normals
+        offsets = np.zeros((n_points, 1), dtype=np.float32)
+        offsets[1:-1] = rng.uniform(-jaggedness, jaggedness, 
+                (max(n_points - 2, 0), 1))
+        # Offset points in direction of normals, reusing the product's buffer:
+        jagged_points = np.multiply(offsets, normals, dtype=np.float32)
+        jagged_points += points
         return jagged_points
 
 
+def pixel_points_list(contours, resolution, origin):
+    """ Returns the pixel points of each of the contours specified.
+    Contours whose cached pixel points are out of date are transformed
+    together in one operation. See Contour2D.pixel_points
+    
+    Args:
+        contours: (list of Contour2D) Contours to get pixel points of
+        resolution: (float) Pixels per mm in the image
+        origin: (2-element list) The xy pixel values of the global origin
+    
+    Returns:
+        list of np.array(n_points, 2), int32: Pixel points of each contour
+    """
+    key = (resolution, tuple(origin))
+    stale = [contour for contour in contours 
+             if contour._pixel_points is None or 
+             contour._pixel_points[0] != key]
+    if len(stale) > 1:
+        jagged_points = [contour.jagged_points() for contour in stale]
+        all_points = np.concatenate(jagged_points) # new array; modify in place
+        all_points *= FLIP_Y * resolution
+        all_points += origin
+        all_points = all_points.astype(np.int32)
+        splits = np.cumsum([len(contour_jagged_points) 
+                            for contour_jagged_points in jagged_points[:-1]])
+        for contour, contour_points in zip(stale, 
+                                           np.split(all_points, splits)):
+            contour._pixel_points = (key, contour_points)
+    return [contour.pixel_points(resolution, origin) 
+            for contour in contours]
+
 
 class LineContour2D(Contour2D):
     """ A 2D line contour. """
@@ -103,43 +207,43 @@ class LineContour2D(Contour2D):
             end: [x, y] end of line segment, mm
         """
         super().__init__([self], **kwargs)
-        self.put("start", np.array(start))
-        self.put("end", np.array(end))
+        self.put("start", np.array(start, dtype=np.float32))
+        self.put("end", np.array(end, dtype=np.float32))
         
     def draw_self(self, img, resolution, origin): 
         """ Draws this contour on the image specified. 
         
         See Entity.draw_self
         """
-        if self.get("jaggedness") > 0:
+        attributes = self.attributes
+        if attributes["jaggedness"] > 0:
             super().draw_self(img, resolution, origin)
         else:
-            points = np.array([self.get("start"), self.get("end")])
-            points = np.array([origin]) + points * [1, -1] * resolution  # px
-            cv2.polylines(img,
-                          np.int32([points]),
-                          isClosed=False,
-                          color=self.attributes["color"], 
-                          thickness=self.attributes["size"], 
+            start, end = to_pixels([attributes["start"], attributes["end"]],
+                    resolution, origin).tolist()
+            cv2.line(img, start, end,
+                          color=attributes["color"], 
+                          thickness=attributes["size"], 
                           lineType=cv2.LINE_AA)
     
     def segments(self):
         """ Returns points and normals of a segmentation into n points.
         
-        See Contour2D.segments
+        See Contour2D.segments. Normals are a read-only broadcast view.
         """
-        np.random.seed(self.get("seed"))
-        spaces = np.random.dirichlet(10 * np.ones(self.get("n_points") - 1))
+        n_points = self.get("n_points")
+        start = self.get("start")
+        delta = self.get("end") - start
+        
+        rng = np.random.default_rng(self.get("seed"))
+        spaces = rng.dirichlet(10 * np.ones(n_points - 1))
         spaces = np.hstack([0, spaces])
                 # spaces has n_points entries that sum to 1
-        points = (np.tile(self.get("start"), (len(spaces), 1)) +
-                        np.multiply.outer(np.cumsum(spaces), 
-                                (self.get("end") - self.get("start"))))
+        points = start + np.cumsum(spaces, dtype=np.float32)[:, None] * delta
 
-        normal = (np.array([[0, -1], [1, 0]]) @ (self.get("end") - 
-                self.get("start")) / np.linalg.norm(self.get("end") - 
-                self.get("start")))
-        normals = np.linspace(normal, normal, self.get("n_points"))
+        normal = (np.array([[0, -1], [1, 0]], dtype=np.float32) @ delta / 
+                np.linalg.norm(delta))
+        normals = np.broadcast_to(normal, (n_points, 2))
         return (points, normals)
     
 
@@ -156,7 +260,7 @@ class ArcContour2D(Contour2D):
             end_ang: (float) end angle of arc, rad
         """
         super().__init__([self], **kwargs)
-        self.put("ctr", np.array(center))
+        self.put("ctr", np.array(center, dtype=np.float32))
         self.put("rad", radius)
         self.put("ang1", start_ang)
         self.put("ang2", end_ang)
@@ -167,35 +271,48 @@ class ArcContour2D(Contour2D):
         
         See Entity.draw_self
         """
-        if self.get("jaggedness") > 0:
+        attributes = self.attributes
+        if attributes["jaggedness"] > 0:
             super().draw_self(img, resolution, origin)
         else:
+            ctr = to_pixels(attributes["ctr"], resolution, origin).tolist()
+            rad = int(attributes["rad"] * resolution)
             cv2.ellipse(img, 
-                        (int(origin[0] + self.get("ctr")[0] * resolution), 
-                         int(origin[1] - self.get("ctr")[1] * resolution)),
-                        (int(self.get("rad") * resolution), 
-                         int(self.get("rad") * resolution)),
+                        ctr,
+                        (rad, rad),
                         0, 
-                        -np.rad2deg(self.get("ang1")),
-                        -np.rad2deg(self.get("ang2")),
-                        color=self.get("color"), 
-                        thickness=self.get("size"), 
+                        -np.rad2deg(attributes["ang1"]),
+                        -np.rad2deg(attributes["ang2"]),
+                        color=attributes["color"], 
+                        thickness=attributes["size"], 
                         lineType=cv2.LINE_AA)
     
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of the full circle of this arc, 
+        unless jagged. See Entity.bbox 
+        """
+        attributes = self.attributes
+        if attributes["jaggedness"] > 0:
+            return super().bbox(resolution, origin)
+        center = project(attributes["ctr"], resolution, origin)
+        return pixel_bbox(center[None, :], 
+                int(attributes["rad"] * resolution) + attributes["size"] + 2)
+    
     def segments(self):
         """ Returns points and normals of a segmentation into n points.
         
         See Contour2D.segments
         """
-        np.random.seed(self.get("seed"))
-        spaces = np.random.dirichlet(10 * np.ones(self.get("n_points") - 1))
+        ang1 = self.get("ang1")
+        sweep = self.get("ang2") - ang1
+        
+        rng = np.random.default_rng(self.get("seed"))
+        spaces = rng.dirichlet(10 * np.ones(self.get("n_points") - 1))
         spaces = np.hstack([0, spaces])
                 # spaces has n_points entries that sum to 1
-        angs = np.array([self.get("ang1") + 
-                (self.get("ang2") - self.get("ang1")) * np.cumsum(spaces)]).T
-        points = (self.get("ctr") + 
-                self.get("rad") * np.hstack([np.cos(angs), np.sin(angs)]))
-        normals = np.hstack([np.cos(angs), np.sin(angs)])
+        angs = ang1 + sweep * np.cumsum(spaces, dtype=np.float32)
+        normals = np.column_stack([np.cos(angs), np.sin(angs)])
+        points = self.get("ctr") + self.get("rad") * normals
         return (points, normals)
                       
 
@@ -5,16 +5,62 @@
 #
 
 
+import math
 import numpy as np
-from pyquaternion import Quaternion
-import cv2
-from collections.abc import Iterable
 from .entity import Entity
-from .primatives import *
+from .primatives import P, Line_Seg, Disk, Wedge, Polygon, Text
 from ..funcs import dist_to_poly
 import copy
 
 
+_TAU_OVER_100 = 2. * math.pi / 100. # Needle rotation (rad) per readout unit
+_HALF_PI = math.pi / 2.
+
+
+def _check_min_max(readout, min_swept, max_swept):
+    """ Checks if a needle readout is within the min/max swept readouts.
+    Numeric core of Dial_Indicator.check_min_max, on plain floats.
+    
+    Args:
+        readout: (float) Needle readout, 0 - 100
+        min_swept: (float) Minimum swept readout, 0 - 100
+        max_swept: (float) Maximum swept readout, 0 - 100
+    
+    Returns:
+        int: 0 if needle in bounds. -1 if exceeds min. 1 if exceeds max.
+    """
+    
+    # Calc angles. #
+    readout_angle = -readout * _TAU_OVER_100
+    min_angle = -min_swept * _TAU_OVER_100
+    max_angle = -max_swept * _TAU_OVER_100
+
+    # Create unit vectors (x, y components). #
+    readout_x, readout_y = math.cos(readout_angle), math.sin(readout_angle)
+    min_x, min_y = math.cos(min_angle), math.sin(min_angle)
+    max_x, max_y = math.cos(max_angle), math.sin(max_angle)
+
+    # Calculate z of cross product. Negative cross product indicates 
+    # exceedance.
+    min_exceeded = min_x * readout_y - min_y * readout_x <= 0
+    max_exceeded = readout_x * max_y - readout_y * max_x <= 0
+
+    # Check which direction is more closely exceeded.
+    if min_exceeded and not max_exceeded:
+        return -1
+    if max_exceeded and not min_exceeded:
+        return 1
+    if min_exceeded or max_exceeded:
+        if (min_x * readout_x + min_y * readout_y >= 
+                max_x * readout_x + max_y * readout_y):
+            return -1
+        else:
+            return 1
+
+    # If no exceedance,
+    return 0
+
+
 class Dial_Indicator(Entity):
     """ A manual a dial indicator with gauge and needle. 
     
@@ -85,28 +131,46 @@ class Dial_Indicator(Entity):
     # Tracking distance
     PLUNG_TIP_TRACK_SCALE = 1.610 # Ratio of ctr <-> probe dist to dial dia
     
+    # Polygon vertices, as ratios to dial dia
+    COLUMN_PTS_SCALE = np.array([
+            [-COLUMN_WD_SCALE / 2., COLUMN_HGH_CHM_LG_SCALE, 0],
+            [-COLUMN_CHM_WD_SCALE / 2., COLUMN_HGH_LG_SCALE, 0],
+            [ COLUMN_CHM_WD_SCALE / 2., COLUMN_HGH_LG_SCALE, 0],
+            [ COLUMN_WD_SCALE / 2., COLUMN_HGH_CHM_LG_SCALE, 0],
+            [ COLUMN_WD_SCALE / 2., -COLUMN_LOW_CHM_LG_SCALE, 0],
+            [ COLUMN_CHM_WD_SCALE / 2., -COLUMN_LOW_LG_SCALE, 0],
+            [-COLUMN_CHM_WD_SCALE / 2., -COLUMN_LOW_LG_SCALE, 0],
+            [-COLUMN_WD_SCALE / 2., -COLUMN_LOW_CHM_LG_SCALE, 0]])
+    PLUNG_PTS_SCALE = np.array([
+            [-PLUNG_DIA_SCALE / 2., -PLUNG_LG_SCALE, 0],
+            [-PLUNG_DIA_SCALE / 2., COLUMN_HGH_LG_SCALE, 0],
+            [-PLUNG_TOP_DIA_SCALE / 2., COLUMN_HGH_LG_SCALE, 0],
+            [-PLUNG_TOP_DIA_SCALE / 2., PLUNG_TOP_CHM_LG_SCALE, 0],
+            [-PLUNG_TOP_CHM_DIA_SCALE / 2., PLUNG_TOP_LG_SCALE, 0],
+            [ PLUNG_TOP_CHM_DIA_SCALE / 2., PLUNG_TOP_LG_SCALE, 0],
+            [ PLUNG_TOP_DIA_SCALE / 2., PLUNG_TOP_CHM_LG_SCALE, 0],
+            [ PLUNG_TOP_DIA_SCALE / 2., COLUMN_HGH_LG_SCALE, 0],
+            [ PLUNG_DIA_SCALE / 2., COLUMN_HGH_LG_SCALE, 0],
+            [ PLUNG_DIA_SCALE / 2., -PLUNG_LG_SCALE, 0]])
+    PLUNG_TIP_PTS_SCALE = np.array([
+            [-PLUNG_TIP_MOUNT_CHM_DIA_SCALE / 2., -PLUNG_TIP_LG_SCALE, 0],
+            [-PLUNG_TIP_MOUNT_DIA_SCALE / 2., -PLUNG_TIP_CHM_LG_SCALE, 0],
+            [-PLUNG_TIP_MOUNT_DIA_SCALE / 2., -PLUNG_LG_SCALE, 0],
+            [ PLUNG_TIP_MOUNT_DIA_SCALE / 2., -PLUNG_LG_SCALE, 0],
+            [ PLUNG_TIP_MOUNT_DIA_SCALE / 2., -PLUNG_TIP_CHM_LG_SCALE, 0],
+            [ PLUNG_TIP_MOUNT_CHM_DIA_SCALE / 2., -PLUNG_TIP_LG_SCALE, 0]])
+    
     # Legend
     LEGEND_ARROW_SCALE = .03 # Ratio of legend arrow length to dial dia
     
-    # Leader line distances in mm, unscaled:
-    LEGEND_L1A_START = np.array([-1.2, 0, 0])
-    LEGEND_L1A_END = np.array([-.25, 0, 0])
-    LEGEND_L1B_START = np.array([-.25, .375, 0])
-    LEGEND_L1B_END = np.array([-.25, -.375, 0])
-    
-    LEGEND_L2A_START = [-1, 1, 1] * LEGEND_L1A_START
-    LEGEND_L2A_END = [-1, 1, 1] * LEGEND_L1A_END
-    LEGEND_L2B_START = [-1, 1, 1] * LEGEND_L1B_START
-    LEGEND_L2B_END = [-1, 1, 1] * LEGEND_L1B_END
-    
-    # Arrow triangle distances in mm, unscaled:
-    LEGEND_T1_P1 = np.array([-.625, .1875, 0])
-    LEGEND_T1_P2 = np.array([-.25, 0, 0])
-    LEGEND_T1_P3 = np.array([-.625, -.1875, 0])
-    
-    LEGEND_T2_P1 = [-1, 1, 1] * LEGEND_T1_P1
-    LEGEND_T2_P2 = [-1, 1, 1] * LEGEND_T1_P2
-    LEGEND_T2_P3 = [-1, 1, 1] * LEGEND_T1_P3
+    # Leader line & arrow triangle distances in mm, unscaled. 
+    # Arrow 1 points left; arrow 2 is its mirror image, pointing right.
+    LEGEND_ARROW_1_PTS = np.array([[-1.2, 0, 0], [-.25, 0, 0], # Leader a
+                                   [-.25, .375, 0], [-.25, -.375, 0], # b
+                                   [-.625, .1875, 0], [-.25, 0, 0], # Triangle
+                                   [-.625, -.1875, 0]])
+    LEGEND_PTS = np.vstack([LEGEND_ARROW_1_PTS, 
+                            [-1, 1, 1] * LEGEND_ARROW_1_PTS])
 
     LEGEND_NUM_SCALE = .001 # Ratio of number font scale factor to dial dia
     LEGEND_DISP_SCALE = np.array([-.07, -.18, 0]) # Pos ratios to dial dia
@@ -122,6 +186,9 @@ class Dial_Indicator(Entity):
     PLUNG_COLOR = [190, 190, 190] # Light gray plunger 
     PLUNG_TIP_COLOR = [0, 0, 128] # Plunger tip
     
+    # Unattached geometry templates, keyed by (class, diameter). 
+    # See create_geometry.
+    _GEOM_CACHE = {}
     
     def __init__(self, diameter, deflection=0, highlight_show=False, 
                     plunger_show=True, readout_scale=1.00, **kwargs):
@@ -138,7 +205,52 @@ class Dial_Indicator(Entity):
         super().__init__(**kwargs)
         self.attributes["diameter"] = diameter
         self.attributes["readout_scale"] = readout_scale
+        self._rotz_buf = np.identity(3) # see _rotz
         
+        # Build geometry, or copy it from an indicator of the same size
+        self._build_cached(self.create_geometry)
+        
+        # Combine dial, needle and plunger
+        self.add_components(self.plunger, self.dial, self.needle)
+        
+        # Set deflection. Highlight & plunger are built by display_* below.
+        self.attributes["highlight_show"] = False
+        self.attributes["plunger_show"] = False
+        self.attributes["min_swept"] = 0 # Reset to initial readout below
+        self.attributes["max_swept"] = 0
+        self.set_deflection(deflection)
+        self.reset_highlight() # Reset highlight to the deflection specified
+        self.display_highlight(highlight_show)
+        self.display_plunger(plunger_show)
+    
+    def _build_cached(self, create):
+        """ Calls the create function specified to build sub-entities, or 
+        copies them from an indicator of the same size which already built them.
+        
+        Args:
+            create: (bound method) Method of this indicator taking the diameter,
+                    which sets the sub-entities it builds as instance variables.
+        """
+        key = (type(self), self.attributes["diameter"], create.__name__)
+        if key not in self._GEOM_CACHE:
+            existing = set(vars(self))
+            create(self.attributes["diameter"])
+            self._GEOM_CACHE[key] = copy.deepcopy(
+                    {name: value for name, value in vars(self).items() 
+                     if name not in existing})
+        else:
+            vars(self).update(copy.deepcopy(self._GEOM_CACHE[key]))
+    
+    def create_geometry(self, diameter):
+        """ Builds the needle, dial, and plunger sub-entities of the indicator.
+        The geometry only depends on the diameter, so it is built once per 
+        diameter and copied for subsequent indicators. The plunger and highlight
+        parts are only built when first displayed; see display_plunger and 
+        display_highlight. 
+        
+        Args:
+            diameter: (float) Diameter of dial indicator to fit inside (mm) 
+        """
         # ## Needle ## #
         center_cap = Disk(diameter * self.CENTER_CAP_SCALE / 2.0, 
                 color=self.NEEDLE_COLOR)
@@ -156,72 +268,15 @@ class Dial_Indicator(Entity):
         self.holder_circle = Disk(diameter * self.HOLDER_WD_SCALE / 2., 
                                pos=[0, -diameter * self.HOLDER_LG_SCALE, 0],
                                color=self.RIM_COLOR)
-        self.holder_column = Polygon([
-                P([-diameter * self.COLUMN_WD_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_CHM_LG_SCALE, 0]),
-                P([-diameter * self.COLUMN_CHM_WD_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_LG_SCALE, 0]),
-                P([ diameter * self.COLUMN_CHM_WD_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_LG_SCALE, 0]),
-                P([ diameter * self.COLUMN_WD_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_CHM_LG_SCALE, 0]),
-                            
-                P([ diameter * self.COLUMN_WD_SCALE / 2., 
-                   -diameter * self.COLUMN_LOW_CHM_LG_SCALE, 0]),
-                P([ diameter * self.COLUMN_CHM_WD_SCALE / 2., 
-                   -diameter * self.COLUMN_LOW_LG_SCALE, 0]),
-                P([-diameter * self.COLUMN_CHM_WD_SCALE / 2., 
-                   -diameter * self.COLUMN_LOW_LG_SCALE, 0]),
-                P([-diameter * self.COLUMN_WD_SCALE / 2., 
-                   -diameter * self.COLUMN_LOW_CHM_LG_SCALE, 0])],
+        self.holder_column = Polygon(
+                [P(pt) for pt in diameter * self.COLUMN_PTS_SCALE],
                 color=self.RIM_COLOR)
         
         self.dial.add_components(self.rim, self.holder_column, 
                 self.holder_circle)
         
         # Plunger # 
-        self.plunger_body = Polygon([
-                P([-diameter * self.PLUNG_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_LG_SCALE, 0]),
-                P([-diameter * self.PLUNG_DIA_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_LG_SCALE, 0]),
-                P([-diameter * self.PLUNG_TOP_DIA_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_LG_SCALE, 0]),
-                P([-diameter * self.PLUNG_TOP_DIA_SCALE / 2., 
-                    diameter * self.PLUNG_TOP_CHM_LG_SCALE, 0]),
-                P([-diameter * self.PLUNG_TOP_CHM_DIA_SCALE / 2., 
-                    diameter * self.PLUNG_TOP_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_TOP_CHM_DIA_SCALE / 2., 
-                    diameter * self.PLUNG_TOP_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_TOP_DIA_SCALE / 2., 
-                    diameter * self.PLUNG_TOP_CHM_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_TOP_DIA_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_DIA_SCALE / 2., 
-                    diameter * self.COLUMN_HGH_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_LG_SCALE, 0])],
-                color=self.PLUNG_COLOR)
-        
-        self.plunger_tip = Polygon([
-                P([-diameter * self.PLUNG_TIP_MOUNT_CHM_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_TIP_LG_SCALE, 0]),
-                P([-diameter * self.PLUNG_TIP_MOUNT_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_TIP_CHM_LG_SCALE, 0]),
-                P([-diameter * self.PLUNG_TIP_MOUNT_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_TIP_MOUNT_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_TIP_MOUNT_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_TIP_CHM_LG_SCALE, 0]),
-                P([ diameter * self.PLUNG_TIP_MOUNT_CHM_DIA_SCALE / 2., 
-                   -diameter * self.PLUNG_TIP_LG_SCALE, 0])], 
-                color=self.PLUNG_TIP_COLOR)
-                   
-        self.plunger = Entity(components=[self.plunger_body, 
-                self.plunger_tip])
-
-                       
+        self.plunger = Entity() # parts added by _build_plunger
         
         # Face #
         face = Disk(diameter / 2.0 * self.RIM_THICK_SCALE, 
@@ -230,77 +285,56 @@ class Dial_Indicator(Entity):
         
         # Ticks # 
         indices = 100
-        for i in range(indices):
-            if i % 10 == 0: # major index
-                tick = Line_Seg([0, diameter * self.MAJ_TICK_SCALE / 2.0, 0], 
-                            [0, diameter * (1 + self.RIM_THICK_SCALE) / 4.0, 0],
-                            size=1, color=self.RIM_COLOR)
-            elif i % 5 == 0: # medium index
-                tick = Line_Seg([0, diameter * self.MED_TICK_SCALE / 2.0, 0], 
-                            [0, diameter * (1 + self.RIM_THICK_SCALE) / 4.0, 0],
-                            size=1, color=self.RIM_COLOR)
-            else:
-                tick = Line_Seg([0, diameter * self.MIN_TICK_SCALE / 2.0, 0], 
-                            [0, diameter * (1 + self.RIM_THICK_SCALE) / 4.0, 0],
-                            size=1, color=self.RIM_COLOR)
-            tick.move(dori=Quaternion(axis=[0, 0, 1], 
-                                      radians = i / indices * 2 * np.pi))
-            self.dial.add_components(tick)
+        # Inner radius of each tick: major, medium, or minor index
+        i = np.arange(indices)
+        tick_starts = np.where(i % 10 == 0, self.MAJ_TICK_SCALE, 
+                np.where(i % 5 == 0, self.MED_TICK_SCALE, self.MIN_TICK_SCALE))
+        tick_starts = tick_starts * diameter / 2.0
+        tick_end = diameter * (1 + self.RIM_THICK_SCALE) / 4.0
+        # Rotate [0, r, 0] counter-clockwise to each index angle
+        angles = i * (2 * np.pi / indices)
+        dirs = np.column_stack([-np.sin(angles), np.cos(angles), 
+                np.zeros(indices)])
+        ticks = [Line_Seg(start, end, size=1, color=self.RIM_COLOR) 
+                 for start, end in zip(tick_starts[:, None] * dirs, 
+                                       tick_end * dirs)]
+        self.dial.add_components(ticks)
         
         # Numbers #
-        for i in range(0, indices, 10):
-            self.dial.add_components(Text(str(i), 
-                     self.NUM_SCALE * diameter, 
-                     size=1, 
-                     color=self.RIM_COLOR, 
-                     pos = [self.NUM_SHIFT_SCALE[0] * diameter + 
-                                self.NUM_POS_SCALE * diameter * 
-                                np.cos(-2 * np.pi * i / indices + np.pi / 2) +
-                                self.ZERO_SHIFT_SCALE * diameter * (i == 0),                                
-                            self.NUM_SHIFT_SCALE[1] * diameter + 
-                                self.NUM_POS_SCALE * diameter * 
-                                np.sin(-2 * np.pi * i / indices + np.pi / 2), 
-                            0]))
+        nums = np.arange(0, indices, 10)
+        angles = -2 * np.pi * nums / indices + np.pi / 2
+        xs = (self.NUM_SHIFT_SCALE[0] * diameter + 
+                self.NUM_POS_SCALE * diameter * np.cos(angles) + 
+                self.ZERO_SHIFT_SCALE * diameter * (nums == 0))
+        ys = (self.NUM_SHIFT_SCALE[1] * diameter + 
+                self.NUM_POS_SCALE * diameter * np.sin(angles))
+        numbers = [Text(str(num), 
+                        self.NUM_SCALE * diameter, 
+                        size=1, 
+                        color=self.RIM_COLOR, 
+                        pos=[x, y, 0]) 
+                   for num, x, y in zip(nums, xs, ys)]
+        self.dial.add_components(numbers)
         
         # Measurement Wedge, min & max lines #
-        self.meas_wedge = Wedge(self.RIM_THICK_SCALE * diameter / 2., 
-                           np.pi/2, np.pi/2,
-                           color=self.MEAS_WEDGE_COLOR, 
-                           opacity=self.MEAS_WEDGE_OPACITY)
-        self.meas_min_line = Line_Seg([0, 0, 0], 
-                                 [0, self.RIM_THICK_SCALE * diameter / 2., 0],
-                                 size=2, color=self.MEAS_LINE_COLOR,
-                                 opacity=self.MEAS_LINE_OPACITY)
-        self.meas_max_line = Line_Seg([0, 0, 0], 
-                                 [0, self.RIM_THICK_SCALE * diameter / 2., 0],
-                                 size=2, color=self.MEAS_LINE_COLOR,
-                                 opacity=self.MEAS_LINE_OPACITY)
-        
-        self.dial.add_components(self.meas_wedge, self.meas_min_line, 
-                self.meas_max_line)
+        self.meas_group = Entity() # parts added by _build_highlight
+        self.dial.add_components(self.meas_group)
         
         # Legend #
         arrow_scale = self.LEGEND_ARROW_SCALE * diameter
+        legend_pts = arrow_scale * self.LEGEND_PTS
         
-        self.legend_leader_1a = Line_Seg(arrow_scale * self.LEGEND_L1A_START, 
-                                         arrow_scale * self.LEGEND_L1A_END,
+        self.legend_leader_1a = Line_Seg(legend_pts[0], legend_pts[1],
                                          color=self.RIM_COLOR)
-        self.legend_leader_1b = Line_Seg(arrow_scale * self.LEGEND_L1B_START, 
-                                         arrow_scale * self.LEGEND_L1B_END,
+        self.legend_leader_1b = Line_Seg(legend_pts[2], legend_pts[3],
                                          color=self.RIM_COLOR)
-        self.legend_leader_2a = Line_Seg(arrow_scale * self.LEGEND_L2A_START, 
-                                         arrow_scale * self.LEGEND_L2A_END,
+        self.legend_leader_2a = Line_Seg(legend_pts[7], legend_pts[8],
                                          color=self.RIM_COLOR)
-        self.legend_leader_2b = Line_Seg(arrow_scale * self.LEGEND_L2B_START, 
-                                         arrow_scale * self.LEGEND_L2B_END,
+        self.legend_leader_2b = Line_Seg(legend_pts[9], legend_pts[10],
                                          color=self.RIM_COLOR)
-        self.legend_triangle_1 = Polygon([P(arrow_scale * self.LEGEND_T1_P1),
-                                          P(arrow_scale * self.LEGEND_T1_P2),
-                                          P(arrow_scale * self.LEGEND_T1_P3)],
+        self.legend_triangle_1 = Polygon([P(pt) for pt in legend_pts[4:7]],
                                          color=self.RIM_COLOR)
-        self.legend_triangle_2 = Polygon([P(arrow_scale * self.LEGEND_T2_P1),
-                                          P(arrow_scale * self.LEGEND_T2_P2),
-                                          P(arrow_scale * self.LEGEND_T2_P3)],
+        self.legend_triangle_2 = Polygon([P(pt) for pt in legend_pts[11:14]],
                                          color=self.RIM_COLOR)
 
         self.legend_text = Text("  0.01mm", self.LEGEND_NUM_SCALE * diameter, 
@@ -313,17 +347,6 @@ class Dial_Indicator(Entity):
                 self.legend_triangle_2, self.legend_text])
         self.legend.move(dpos=diameter * self.LEGEND_DISP_SCALE)
         self.dial.add_components(self.legend)
-
-        
-        # Combine dial, needle and plunger
-        self.add_components(self.plunger, self.dial, self.needle)
-        
-        # Set deflection.
-        self.set_deflection(deflection)
-        self.reset_highlight() # Reset highlight to the deflection specified
-        self.display_highlight(highlight_show)
-        self.update_plunger()
-        self.display_plunger(plunger_show)
     
     def set_deflection(self, deflection):
         """ Sets new gauge deflection, moves plunger, and updates dial readout.
@@ -332,12 +355,47 @@ class Dial_Indicator(Entity):
             deflection: (float) New plunger depression (mm)
         """
         self.attributes["deflection"] = deflection
-        # Adjust plunger position.
-        self.update_plunger()
+        # Adjust plunger position. (Updated by display_plunger if hidden)
+        if self.attributes["plunger_show"]:
+            self.update_plunger()
         # Adjust dial
         readout = (deflection / self.attributes["readout_scale"] * 100) % 100
         self.set_readout(readout)
         
+    def _build_plunger(self, diameter):
+        """ Builds the plunger body and tip. See create_geometry.
+        
+        Args:
+            diameter: (float) Diameter of dial indicator to fit inside (mm) 
+        """
+        self.plunger_body = Polygon(
+                [P(pt) for pt in diameter * self.PLUNG_PTS_SCALE],
+                color=self.PLUNG_COLOR)
+        
+        self.plunger_tip = Polygon(
+                [P(pt) for pt in diameter * self.PLUNG_TIP_PTS_SCALE],
+                color=self.PLUNG_TIP_COLOR)
+    
+    def _build_highlight(self, diameter):
+        """ Builds the measurement wedge and min & max lines. 
+        See create_geometry.
+        
+        Args:
+            diameter: (float) Diameter of dial indicator to fit inside (mm) 
+        """
+        self.meas_wedge = Wedge(self.RIM_THICK_SCALE * diameter / 2., 
+                           np.pi/2, np.pi/2,
+                           color=self.MEAS_WEDGE_COLOR, 
+                           opacity=self.MEAS_WEDGE_OPACITY)
+        self.meas_min_line = Line_Seg([0, 0, 0], 
+                                 [0, self.RIM_THICK_SCALE * diameter / 2., 0],
+                                 size=2, color=self.MEAS_LINE_COLOR,
+                                 opacity=self.MEAS_LINE_OPACITY)
+        self.meas_max_line = Line_Seg([0, 0, 0], 
+                                 [0, self.RIM_THICK_SCALE * diameter / 2., 0],
+                                 size=2, color=self.MEAS_LINE_COLOR,
+                                 opacity=self.MEAS_LINE_OPACITY)
+        
     def set_readout(self, readout):
         """ Changes the position on the dial. 
         
@@ -348,19 +406,18 @@ class Dial_Indicator(Entity):
         
         # Needle #
         self.attributes["readout"] = readout
-        angle = -readout * 2. * np.pi / 100.
-        self.needle.move(ori=np.array([[np.cos(angle), -np.sin(angle), 0], 
-                                       [np.sin(angle), np.cos(angle), 0], 
-                                       [0, 0, 1]]))
+        angle = -readout * _TAU_OVER_100
+        self.needle.move(ori=self._rotz(angle))
         # Min/Max Highlight #
-        if "min_swept" in self.attributes and "max_swept" in self.attributes:
-            if self.check_min_max() == -1: # min exceedance
-                self.attributes["min_swept"] = readout
-            elif self.check_min_max() == 1: # max exceedance 
-                self.attributes["max_swept"] = readout
-        else: # Not established; on initial object creation
-            self.reset_highlight()
-        self.set_min_max_swept()
+        exceedance = self.check_min_max()
+        if exceedance == 0: # within min/max; highlight is already up to date
+            return
+        if exceedance == -1: # min exceedance
+            self.attributes["min_swept"] = readout
+        else: # max exceedance 
+            self.attributes["max_swept"] = readout
+        if self.attributes["highlight_show"]: # else see display_highlight
+            self.set_min_max_swept()
         
 
                                        
@@ -370,67 +427,32 @@ class Dial_Indicator(Entity):
         Returns:
             int: 0 if needle in bounds. -1 if exceeds min. 1 if exceeds max.
         """
-        
-        # Calc angles. #
-        readout_angle = (-self.attributes["readout"] * 2. * np.pi / 100.)
-        min_angle = -self.attributes["min_swept"] * 2. * np.pi / 100.
-        max_angle = -self.attributes["max_swept"] * 2. * np.pi / 100.
-        
-        # Create unit vectors. #
-        readout_vector = np.array([np.cos(readout_angle), 
-                                      np.sin(readout_angle), 0])
-        min_vector = np.array([np.cos(min_angle), 
-                               np.sin(min_angle), 0])
-        max_vector = np.array([np.cos(max_angle), 
-                               np.sin(max_angle), 0])
-        
-        # Calculate cross product. Negative cross product indicates exceedance.
-        min_exceeded = np.sign(np.cross(min_vector, readout_vector))[2] <= 0
-        max_exceeded = np.sign(np.cross(readout_vector, max_vector))[2] <= 0
-        
-        # Check which direction is more closely exceeded.
-        if min_exceeded and not max_exceeded:
-            return -1
-        if max_exceeded and not min_exceeded:
-            return 1
-        if min_exceeded or max_exceeded:
-            if (np.dot(min_vector, readout_vector) >= 
-                    np.dot(max_vector, readout_vector)):
-                return -1
-            else:
-                return 1
-        
-        # If no exceedance,
-        return 0
+        return _check_min_max(self.attributes["readout"], 
+                self.attributes["min_swept"], self.attributes["max_swept"])
     
     def reset_highlight(self):
         """ Resets the min/max swept values, clearing the highlight if visible.
         """
         self.attributes["min_swept"] = self.attributes["readout"]
         self.attributes["max_swept"] = self.attributes["readout"]
-        self.set_min_max_swept()
+        if self.attributes["highlight_show"]: # else see display_highlight
+            self.set_min_max_swept()
         
     def set_min_max_swept(self):
         """ Updates min & max swept lines according to current attribute values.
         """
         
         # Update min sweep line:
-        min_ang = -self.attributes["min_swept"] * 2. * np.pi / 100.
-        self.meas_min_line.move(
-            ori=np.array([[np.cos(min_ang), -np.sin(min_ang), 0], 
-                          [np.sin(min_ang), np.cos(min_ang), 0], 
-                          [0, 0, 1]]))
+        min_ang = -self.attributes["min_swept"] * _TAU_OVER_100
+        self.meas_min_line.move(ori=self._rotz(min_ang))
         
         # Update max sweep line:
-        max_ang = -self.attributes["max_swept"] * 2. * np.pi / 100.
-        self.meas_max_line.move(
-            ori=np.array([[np.cos(max_ang), -np.sin(max_ang), 0], 
-                          [np.sin(max_ang), np.cos(max_ang), 0], 
-                          [0, 0, 1]]))
+        max_ang = -self.attributes["max_swept"] * _TAU_OVER_100
+        self.meas_max_line.move(ori=self._rotz(max_ang))
         
         # Update swept wedge:
-        self.meas_wedge.attributes["start_ang"] = np.pi / 2 + min_ang
-        self.meas_wedge.attributes["end_ang"] = np.pi / 2 + max_ang
+        self.meas_wedge.attributes["start_ang"] = _HALF_PI + min_ang
+        self.meas_wedge.attributes["end_ang"] = _HALF_PI + max_ang
         
     def display_highlight(self, highlight_show):
         """ Enables or disables min/max swept highlight from appearing on gauge.
@@ -440,13 +462,12 @@ class Dial_Indicator(Entity):
         """
         self.attributes["highlight_show"] = highlight_show
         if highlight_show:
-            self.meas_wedge.attributes["visible"] = True
-            self.meas_min_line.attributes["visible"] = True
-            self.meas_max_line.attributes["visible"] = True
-        else:
-            self.meas_wedge.attributes["visible"] = False
-            self.meas_min_line.attributes["visible"] = False
-            self.meas_max_line.attributes["visible"] = False
+            if not self.meas_group.attributes["components"]: # first display
+                self._build_cached(self._build_highlight)
+                self.meas_group.add_components(self.meas_wedge, 
+                        self.meas_min_line, self.meas_max_line)
+            self.set_min_max_swept() # Not updated while hidden
+        self.meas_group.attributes["visible"] = highlight_show
     
     def update_plunger(self):
         """ Updates the plunger position based on the current gauge deflection.
@@ -460,8 +481,33 @@ class Dial_Indicator(Entity):
             plunger_show: Boolean indicating whether plunger should be visible.
         """
         self.attributes["plunger_show"] = plunger_show
+        if plunger_show:
+            if not self.plunger.attributes["components"]: # first display
+                self._build_cached(self._build_plunger)
+                self.plunger.add_components(self.plunger_body, 
+                        self.plunger_tip)
+            self.update_plunger() # Not updated while hidden
         self.plunger.attributes["visible"] = plunger_show
         
+    def _rotz(self, angle):
+        """ Returns the rotation matrix about the z axis by the angle specified.
+        The matrix is a buffer reused by every call; Entity.move copies it.
+        
+        Args:
+            angle: (float) Counter-clockwise rotation angle, rad
+        
+        Returns:
+            Shape (3, 3) Numpy array; rotation matrix
+        """
+        c = math.cos(angle)
+        s = math.sin(angle)
+        rotz = self._rotz_buf
+        rotz[0, 0] = c
+        rotz[0, 1] = -s
+        rotz[1, 0] = s
+        rotz[1, 1] = c
+        return rotz
+        
     def track(self, poly):
         #TODO: Work on more than just polygons
         #TODO: Implement rotation of polygon
@@ -477,7 +523,7 @@ class Dial_Indicator(Entity):
         free_lg = self.PLUNG_TIP_TRACK_SCALE * self.attributes["diameter"]
         
         # Dial starts pointing straight down, rotate by global orientation
-        dir = np.dot(self.gori(), np.array([0, -1, 0])) 
+        dir = -self.gori()[:, 1]
         
         dist = abs(dist_to_poly(poly, P(self.gpos()), dir))
         self.set_deflection(max(free_lg - dist, 0))
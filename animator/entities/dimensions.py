@@ -5,10 +5,75 @@
 #
 
 
+import math
 import numpy as np
-from pyquaternion import Quaternion
 import cv2
-from .entity import Entity
+from .entity import Entity, pixel_bbox
+from ..funcs import project, to_pixels
+
+
+def _norm(v):
+    """ Returns the length of a short vector, without np.linalg.norm overhead.
+    
+    Args:
+        v: Shape (2) or (3) np.array
+    
+    Returns:
+        float: Euclidean length of v
+    """
+    return (v @ v) ** 0.5
+
+
+def _frac_vertices(vertices, extension_lg, arrow_lg, start_arrow, end_arrow):
+    """ Returns vertices of leader segments to be drawn up to a length.
+    Numeric core of Leader.get_frac_vertices, on plain arrays and scalars.
+    
+    Args:
+        vertices: Shape (N, 3) np.array of leader vertices, N >= 2
+        extension_lg: (float) Length along the leader to be drawn
+        arrow_lg: (float) Length of the arrows
+        start_arrow: (bool) Whether arrow is present on first vertex
+        end_arrow: (bool) Whether arrow is present on last vertex
+    
+    Returns:
+        Shape (M, 3) np.array with [x, y, z] coords of segment vertices.
+    """
+    verts = vertices # copied only before being modified or returned
+    
+    # Aesthetic arrow compensation: Add verticies at the triangle bases:
+    if start_arrow:
+        delta = verts[1] - verts[0]
+        new_start = verts[0] + arrow_lg * delta / _norm(delta)
+        verts = np.insert(verts, 1, new_start, axis=0) # new array
+    if end_arrow:
+        delta = verts[-2] - verts[-1]
+        new_end = verts[-1] + arrow_lg * delta / _norm(delta)
+        if verts is vertices:
+            verts = np.copy(vertices)
+        verts[-1] = new_end
+    
+    # Cumulative length at the end of each segment:
+    segment_lgs = np.linalg.norm(verts[1:] - verts[:-1], axis=1)
+    cumulative_lgs = np.cumsum(segment_lgs)
+    # Number of whole segments within the extension:
+    n_whole = int(np.searchsorted(cumulative_lgs, extension_lg, side="right"))
+    
+    if n_whole == len(segment_lgs): # fully extended
+        output = np.copy(verts) if verts is vertices else verts
+    else:
+        output = np.empty((n_whole + 2, verts.shape[1]))
+        output[:n_whole + 1] = verts[:n_whole + 1]
+        # Go partway of distance between prev and curr
+        prev = verts[n_whole]
+        dir = (verts[n_whole + 1] - prev) / segment_lgs[n_whole]
+        partway_lg = extension_lg - (cumulative_lgs[n_whole - 1] 
+                if n_whole > 0 else 0.0)
+        output[n_whole + 1] = prev + dir * partway_lg
+    
+    if start_arrow:
+        output = output[1:]
+        
+    return output
 
 
 #TODO: 3d functionality for rotated leaders. Consider using primatives instead.
@@ -22,6 +87,10 @@ class Leader(Entity):
         extension (float): Fraction to be drawn, from 0-1.
     """
     
+    ARROW_TAPER = .25  # Half angle of arrow tip, radians. 
+    ARROW_TAN = math.tan(ARROW_TAPER)
+    ARROW_LENGTH = .09  # mm  #TODO: zoom independent arrow sizes?
+    
     def __init__(self, vertices, start_arrow=False, end_arrow=False, 
             extension=0., **kwargs):
         """ Creates a new Line Segment. 
@@ -32,10 +101,8 @@ class Leader(Entity):
             end_arrow (bool): Whether arrow is present on last vertex.
         """
         super().__init__(**kwargs)
-        self.ARROW_TAPER = .25  # Half angle of arrow tip, radians. 
-        self.ARROW_LENGTH = .09  # mm  #TODO: zoom independent arrow sizes?
         self.put("arrow_lg", (self.get("size") ** 0.5) * self.ARROW_LENGTH)
-        self.put("vertices", np.array(vertices))
+        self.put("vertices", np.array(vertices, dtype=np.float32))
         self.put("start_arrow", start_arrow)
         self.put("end_arrow", end_arrow)
         self.put("extension", extension)
@@ -50,13 +117,11 @@ class Leader(Entity):
     
     def length(self):
         """ Returns the total length of all leader segments (float). """
-        total_lg = 0.0
-        for i in range(1, len(self.get("vertices"))):
-            total_lg += (
-                (self.get("vertices")[i][0] - self.get("vertices")[i-1][0]) ** 2
-              + (self.get("vertices")[i][1] - self.get("vertices")[i-1][1]) ** 2
-            ) ** 0.5
-        return total_lg
+        verts = self.attributes["vertices"]
+        if len(verts) < 2:
+            return 0.0
+        deltas = verts[1:, :2] - verts[:-1, :2] # xy only
+        return float(np.sqrt(np.einsum("ij,ij->i", deltas, deltas)).sum())
     
     def get_frac_vertices(self):
         """ Returns vertices of line segments to be drawn, given extension.
@@ -64,49 +129,17 @@ class Leader(Entity):
         Returns:
            Shape (N, 3) np.array with [x, y, z] coords of segment vertices.
         """
-        if len(self.get("vertices")) == 0 or self.get("extension") < 1E-8:
+        attributes = self.attributes
+        vertices = attributes["vertices"]
+        extension = attributes["extension"]
+        if len(vertices) == 0 or extension < 1E-8:
             return np.zeros((0, 3))
-
-        verts = np.copy(self.get("vertices"))
-        output = np.copy([verts[0]])
+        if len(vertices) == 1:
+            return np.copy(vertices)
         
-        if len(self.get("vertices")) == 1:
-            return output
-            
-        # Aesthetic arrow compensation: Add verticies at the triangle bases:
-        if self.get("start_arrow"):
-            new_start = verts[0] + (self.get("arrow_lg") * 
-                (verts[1] - verts[0]) / np.linalg.norm(verts[1] - verts[0]))
-            verts = np.insert(verts, 1, new_start, axis=0)
-        if self.get("end_arrow"):
-            new_end = verts[-1] + (self.get("arrow_lg") * 
-                (verts[-2] - verts[-1]) / np.linalg.norm(verts[-2] - verts[-1]))
-            verts[-1] = new_end
-        
-        total_lg = self.length()
-        current_lg = 0.0
-        
-        for i in range(1, len(verts)):
-            curr = verts[i]
-            prev = verts[i-1]
-            
-            delta_lg = np.linalg.norm(curr - prev)
-            
-            if current_lg + delta_lg <= total_lg * self.get("extension"):
-                output = np.vstack((output, curr))
-                current_lg += delta_lg
-            else:
-                # Go partway of distance between prev and curr
-                dir = (curr - prev) / np.linalg.norm(curr - prev)
-                partway_lg = self.get("extension") * total_lg - current_lg
-                partial = prev + dir * partway_lg
-                output = np.vstack((output, partial))
-                break
-        
-        if self.get("start_arrow"):
-            output = output[1:]
-            
-        return output
+        return _frac_vertices(vertices, self.length() * extension, 
+                attributes["arrow_lg"], attributes["start_arrow"], 
+                attributes["end_arrow"])
         
     def get_start_arrow(self):
         """ Computes the vertices of the triangular start arrow.
@@ -115,20 +148,23 @@ class Leader(Entity):
         Returns:
             Shape(1, 3, 3) np.array: [[[xyz1], [xyz2], [xyz3]]]
         """ 
-        if len(self.get("vertices")) < 2:
+        attributes = self.attributes
+        vertices = attributes["vertices"]
+        if len(vertices) < 2:
             return np.array(np.zeros((1, 0, 3)))
         
-        bounded_lg = min(self.get("extension") * self.length(), 
-                       self.get("arrow_lg"))
-        arrow_half_wd = bounded_lg * np.tan(self.ARROW_TAPER)
+        bounded_lg = min(attributes["extension"] * self.length(), 
+                       attributes["arrow_lg"])
+        arrow_half_wd = bounded_lg * self.ARROW_TAN
         
-        start = self.get("vertices")[0]
-        next = self.get("vertices")[1]
-        e = (next - start) / np.linalg.norm(next - start)
+        start = vertices[0]
+        next = vertices[1]
+        e = (next - start) / _norm(next - start)
         n = np.array([-e[1], e[0], e[2]])  #TODO 3D
         
-        vert1 = start + bounded_lg * e + arrow_half_wd * n
-        vert2 = start + bounded_lg * e - arrow_half_wd * n
+        base = start + bounded_lg * e
+        vert1 = base + arrow_half_wd * n
+        vert2 = base - arrow_half_wd * n
         
         return np.array([[start, vert1, vert2]])
     
@@ -139,30 +175,31 @@ class Leader(Entity):
         Returns:
             Shape(1, 4, 3) np.array: [[[xyz1], [xyz2], [xyz3], [xyz4]]]
         """ 
-        if len(self.get("vertices")) < 2:
+        attributes = self.attributes
+        vertices = attributes["vertices"]
+        if len(vertices) < 2:
             return np.array(np.zeros((1, 0, 3)))
         
-        trap_ht = (self.get("extension") * self.length() - 
-                (self.length() - self.get("arrow_lg")))
+        arrow_lg = attributes["arrow_lg"]
+        length = self.length()
+        trap_ht = attributes["extension"] * length - (length - arrow_lg)
         if trap_ht <= 0:
             return np.array(np.zeros((1, 0, 3)))
             
-        base_width = self.get("arrow_lg") * np.tan(self.ARROW_TAPER)
-        mid_width = (self.get("arrow_lg") - trap_ht) * np.tan(self.ARROW_TAPER)
+        base_width = arrow_lg * self.ARROW_TAN
+        mid_width = (arrow_lg - trap_ht) * self.ARROW_TAN
         
-        end = self.get("vertices")[-1]
-        prev = self.get("vertices")[-2]
-        e = (end - prev) / np.linalg.norm(end - prev)
+        end = vertices[-1]
+        prev = vertices[-2]
+        e = (end - prev) / _norm(end - prev)
         n = np.array([-e[1], e[0], e[2]])  #TODO 3D
         
-        base1 = (self.get("vertices")[-1] - self.get("arrow_lg") * e
-                + base_width * n)
-        base2 = (self.get("vertices")[-1] - self.get("arrow_lg") * e
-                - base_width * n)
-        mid1  = (self.get("vertices")[-1] - (self.get("arrow_lg") - trap_ht) * e
-                + mid_width * n)
-        mid2  = (self.get("vertices")[-1] - (self.get("arrow_lg") - trap_ht) * e
-                - mid_width * n)
+        base = end - arrow_lg * e
+        mid = end - (arrow_lg - trap_ht) * e
+        base1 = base + base_width * n
+        base2 = base - base_width * n
+        mid1  = mid + mid_width * n
+        mid2  = mid - mid_width * n
         
         return np.array([[base1, base2, mid2, mid1]])
     
@@ -171,37 +208,86 @@ class Leader(Entity):
         
         See Entity.draw_self
         """
-        frac_vertices = self.get_frac_vertices()
+        attributes = self.attributes
+        pixel_vertices = self.pixel_vertices(resolution, origin)
         
         # Draw lines:
-        for i in range(1, len(frac_vertices)):
-            start = frac_vertices[i-1]
-            end = frac_vertices[i]
-
-            cv2.line(img, (int(origin[0] + start[0] * resolution),
-                           int(origin[1] - start[1] * resolution)),
-                          (int(origin[0] + end[0] * resolution),
-                           int(origin[1] - end[1] * resolution)),
-                           self.get("color"), 
-                           thickness=self.get("size"), 
-                           lineType=cv2.LINE_AA)
-
-        # Draw arrows:
-        if self.get("start_arrow"):
-            pixel_points = (self.get_start_arrow()[:,:,:2] * [1, -1] * 
-                    resolution + origin).astype("int32")
-            cv2.fillConvexPoly(img, pixel_points, self.attributes["color"],
-                    lineType=cv2.LINE_AA)
-                    
-        if self.get("end_arrow"):
-            pixel_points = (self.get_end_arrow()[:,:,:2] * [1, -1] * 
-                    resolution + origin).astype("int32")
-            cv2.fillConvexPoly(img, pixel_points, self.attributes["color"],
-                    lineType=cv2.LINE_AA)  
-    
-    
+        if len(pixel_vertices) > 1:
+            cv2.polylines(img, [pixel_vertices], 
+                          isClosed=False,
+                          color=attributes["color"], 
+                          thickness=attributes["size"], 
+                          lineType=cv2.LINE_AA)
+        
+        self.draw_arrows(img, resolution, origin)
     
+    def pixel_vertices(self, resolution, origin):
+        """ Returns the vertices of line segments to be drawn, in pixels.
+        
+        Args:
+            resolution: (float) Pixels per mm in the image
+            origin: (2-element list) The xy pixel values of the global origin
+        
+        Returns:
+            Shape (N, 2) int32 np.array of xy pixel coords of segment vertices.
+        """
+        return to_pixels(self.get_frac_vertices(), resolution, origin)
     
+    def draw_arrows(self, img, resolution, origin):
+        """ Draws the arrows of this leader on the image specified.
+        
+        See Entity.draw_self
+        """
+        attributes = self.attributes
+        color = attributes["color"]
+        
+        if attributes["start_arrow"]:
+            pixel_points = to_pixels(self.get_start_arrow(), resolution, 
+                    origin)
+            cv2.fillConvexPoly(img, pixel_points, color,
+                    lineType=cv2.LINE_AA)
+                    
+        if attributes["end_arrow"]:
+            pixel_points = to_pixels(self.get_end_arrow(), resolution, 
+                    origin)
+            cv2.fillConvexPoly(img, pixel_points, color,
+                    lineType=cv2.LINE_AA)
     
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this leader when fully extended.
+        See Entity.bbox
+        """
+        attributes = self.attributes
+        vertices = attributes["vertices"]
+        if len(vertices) == 0:
+            return None
+        return pixel_bbox(project(vertices, resolution, origin),
+                attributes["size"] + int(attributes["arrow_lg"] * resolution) 
+                + 2)
     
+    def batch_key(self):
+        """ Returns a key shared by opaque leaders of the same color and size.
+        See Entity.batch_key
+        """
+        attributes = self.attributes
+        if (not attributes["visible"] or attributes["opacity"] != 1 or 
+                attributes["extension"] <= 0):
+            return None
+        return (type(self), tuple(attributes["color"]), attributes["size"])
     
+    def draw_batch(self, batch, img, resolution, origin):
+        """ Draws the line segments of a batch of leaders in one call, followed
+        by their arrows. See Entity.draw_batch
+        """
+        polylines = [pixel_vertices for pixel_vertices in 
+                     (leader.pixel_vertices(resolution, origin) 
+                      for leader in batch) 
+                     if len(pixel_vertices) > 1]
+        if polylines:
+            cv2.polylines(img, polylines, 
+                          isClosed=False,
+                          color=self.attributes["color"], 
+                          thickness=self.attributes["size"], 
+                          lineType=cv2.LINE_AA)
+        for leader in batch:
+            leader.draw_arrows(img, resolution, origin)
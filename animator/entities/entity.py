@@ -6,17 +6,87 @@
 
 
 import numpy as np
-from pyquaternion import Quaternion
 import cv2
-from collections.abc import Iterable
-import copy
+
+
+def pixel_bbox(pixel_points, margin):
+    """ Returns the pixel bounding box of the pixel points specified.
+    
+    Args:
+        pixel_points: Shape (N, 2) Numpy array; xy pixel coordinates
+        margin: (int) Pixels added on every side, e.g. for line thickness
+    
+    Returns:
+        [x0, y0, x1, y1] list of ints, x1 and y1 exclusive. None if N = 0.
+    """
+    if len(pixel_points) == 0:
+        return None
+    lower = np.floor(np.min(pixel_points, axis=0))
+    upper = np.ceil(np.max(pixel_points, axis=0))
+    return [int(lower[0]) - margin, int(lower[1]) - margin, 
+            int(upper[0]) + margin + 1, int(upper[1]) + margin + 1]
+
+
+def bbox_union(bboxes):
+    """ Returns the pixel bounding box containing all bounding boxes specified.
+    
+    Args:
+        bboxes: (list) [x0, y0, x1, y1] pixel bounding boxes, or None if unknown
+    
+    Returns:
+        [x0, y0, x1, y1] list of ints. None if bboxes is empty or any is None.
+    """
+    if len(bboxes) == 0 or any(bbox is None for bbox in bboxes):
+        return None
+    x0s, y0s, x1s, y1s = zip(*bboxes)
+    return [min(x0s), min(y0s), max(x1s), max(y1s)]
+
+
+def add_all_to_image(entities, img, resolution, origin):
+    """ Adds entities on the image specified, in order. Consecutive entities 
+    with the same batch key are drawn together, see Entity.batch_key
+    
+    Args:
+        entities: (iterable of Entity) Entities to add; later ones on top
+        img: (3-element Numpy array) The bgr image to be drawn on
+        resolution: (float) Pixels per mm in the image
+        origin: (2-element list) The xy pixel values of the global origin
+    """
+    batch, batch_key = [], None
+    for entity in entities:
+        key = entity.batch_key()
+        if key is None or key != batch_key:
+            if batch:
+                batch[0].draw_batch(batch, img, resolution, origin)
+            batch, batch_key = [], key
+        if key is None:
+            entity.add_to_image(img, resolution, origin)
+        else:
+            batch.append(entity)
+    if batch:
+        batch[0].draw_batch(batch, img, resolution, origin)
 
 
 #TODO implement rotation for entities and primatives
 class Entity:
     """ A single entity that may be displayed. """
     
-    def __init__(self, components=[], opacity=1.0, color=[255, 255, 255], 
+    # All state is kept in the attributes dict; subclasses which do the same 
+    # declare empty __slots__ so their instances carry no __dict__.
+    __slots__ = ("attributes", "_global_cache", "_changed")
+    
+    # Attributes which affect the global position, orientation, or opacity of
+    # an Entity and all of its components.
+    GLOBAL_ATTRIBUTES = ("pos", "ori", "opacity", "parent")
+    
+    # Incremented whenever a global attribute of any Entity changes through 
+    # put, move, or add_components. Each Entity records in _changed the version
+    # at which it, an ancestor, or a descendant last changed; cached global 
+    # values calculated before it or a parent last changed are stale. 
+    # See _invalidate and _last_change.
+    _version = 0
+    
+    def __init__(self, components=(), opacity=1.0, color=[255, 255, 255], 
             dtype='uint8', size=1, parent=None, pos=[0., 0., 0.], 
             ori=[[1., 0., 0.], [0., 1., 0.], [0., 0., 1.]], visible=True):
         """ Creates a new empty Entity. 
@@ -39,6 +109,10 @@ class Entity:
                 visible      -> Boolean determining whether entity is actively
                                 visible and should be drawn on the scene
         """
+        # Cached global values, each as (version, value). See Entity._version
+        self._global_cache = {}
+        self._changed = Entity._version
+        
         # Default attributes
         self.attributes = {}
 
@@ -47,8 +121,8 @@ class Entity:
         self.attributes["color"] = color # bgr
         self.attributes["size"] = size
         self.attributes["parent"] = parent
-        self.attributes["pos"] = np.array(pos)
-        self.attributes["ori"] = np.array(ori)
+        self.attributes["pos"] = np.array(pos, dtype=np.float32)
+        self.attributes["ori"] = np.array(ori, dtype=np.float32)
         self.attributes["components"] = [] # List of Entities & points
         self.add_components(components)
     
@@ -61,6 +135,44 @@ class Entity:
             new_val (various): new value of attribute to set
         """
         self.attributes[attribute] = new_val
+        if attribute in self.GLOBAL_ATTRIBUTES:
+            self._invalidate()
+    
+    def _invalidate(self):
+        """ Marks cached global values stale for this Entity, all of its 
+        components (whose global values build on it), and all of its parents 
+        (whose values, such as polygon points, may build on their components).
+        Other Entities keep their cached values.
+        """
+        Entity._version += 1
+        version = Entity._version
+        seen = set() # guards against self-contained entities, e.g. contours
+        entities = [self]
+        while entities:
+            entity = entities.pop()
+            if id(entity) not in seen:
+                seen.add(id(entity))
+                entity._changed = version
+                entities.extend(entity.attributes["components"])
+        parent = self.attributes["parent"]
+        while parent is not None and id(parent) not in seen:
+            seen.add(id(parent))
+            parent._changed = version
+            parent = parent.attributes["parent"]
+    
+    def _last_change(self):
+        """ Returns the version at which this Entity or any of its parents last
+        changed. Cached global values calculated at an earlier version are stale.
+        Parents are checked as well as _changed, since an Entity given its 
+        parent by parent= is not among the parent's components, so is not 
+        marked by the parent's _invalidate.
+        """
+        changed = self._changed
+        entity, parent = self, self.attributes["parent"]
+        while parent is not None and parent is not entity: # e.g. contours
+            changed = max(changed, parent._changed)
+            entity, parent = parent, parent.attributes["parent"]
+        return changed
     
     def get(self, attribute):
         """ Gets specified attribute.
@@ -90,25 +202,63 @@ class Entity:
     def gpos(self, local_pos=None):
         """ Returns a copy of this Entity's origin wrt global csys.
         
-        Recursively navigates through chain of parents until global entity
-        (parent=None) is reached.
+        Builds on the cached global transform of the parent, so the chain of 
+        parents is only navigated again after one of them has changed.
         
         Args:
-            local_pos: Used in recursive calculation. Represents the position
-                       that will be reported in the global coordinate system,
-                       in the coordinate system of this current Entity. 
+            local_pos: Represents the position that will be reported in the 
+                       global coordinate system, in the coordinate system of 
+                       this Entity's parent. 
                        If local_pos=None, use position of this Entity from pos()
         
         Returns:
             Shape (3) Numpy array; coordinates of the origin of this Entity
         """
-        if local_pos is None:  # initial Entity in the recursive stack
-            local_pos = self.pos() 
-        if self.attributes["parent"] == None:  # end of stack; global parent
+        if local_pos is None:
+            return np.copy(self._global_transform()[0])
+        if self.attributes["parent"] is None: # global parent
             return local_pos
-        return self.attributes["parent"].gpos(
-                local_pos=self.attributes["parent"].pos() + 
-                self.attributes["parent"].ori() @ local_pos)
+        parent_pos, parent_rot = self.attributes["parent"]._global_transform()
+        return parent_pos + parent_rot @ local_pos
+    
+    def _global_transform(self):
+        """ Returns the cached global origin & rotation of this Entity's csys.
+        Recalculated from the parent's if it or a parent has changed since.
+        
+        Returns:
+            A 2-tuple containing
+                Shape (3) Numpy array; global coordinates of the origin
+                Shape (3, 3) Numpy array; rotation from this Entity's csys to 
+                        the global csys. Must not be modified by the caller.
+        """
+        version = Entity._version
+        cached = self._global_cache.get("transform")
+        if cached is not None and cached[0] >= self._last_change():
+            return cached[1]
+
+        # Walk up to the nearest ancestor with a valid transform, if any
+        chain = [self]
+        transform = None
+        parent = self.attributes["parent"]
+        while parent is not None:
+            cached = parent._global_cache.get("transform")
+            if cached is not None and cached[0] >= parent._last_change():
+                transform = cached[1]
+                break
+            chain.append(parent)
+            parent = parent.attributes["parent"]
+
+        # Then compose back down the chain, caching each Entity's transform
+        for entity in reversed(chain):
+            pos = entity.attributes["pos"]
+            ori = entity.attributes["ori"]
+            if transform is None: # global parent
+                transform = (np.copy(pos), np.copy(ori))
+            else:
+                parent_pos, parent_rot = transform
+                transform = (parent_pos + parent_rot @ pos, parent_rot @ ori)
+            entity._global_cache["transform"] = (version, transform)
+        return transform
     
     def ori(self, copy=False):
         """ Returns this Entity's ijk unit vectors wrt parent csys.
@@ -126,20 +276,30 @@ class Entity:
     def gori(self):
         """ Returns a copy of this Entity's ijk unit vectors wrt global csys.
         
-        Recursively navigates through chain of parents until global entity
-        (parent=None) is reached.
+        Builds on the cached value of the parent, so the chain of parents is
+        only navigated again after one of them has changed.
         
         Returns:
             Shape (3, 3) Numpy array; ijk unit vectors this Entity as columns
         """
+        return np.copy(self._gori())
+    
+    def _gori(self):
+        """ Returns the cached value of gori(). Must not be modified. """
+        cached = self._global_cache.get("gori")
+        if cached is not None and cached[0] >= self._last_change():
+            return cached[1]
         
         # Start with the top global orientation, and left multiply the 
         # successive orientation matricies of each child element until we get
         # to self.
         
-        if self.attributes["parent"] == None: # global parent
-            return np.identity(3)
-        return self.ori() @ self.attributes["parent"].gori()
+        if self.attributes["parent"] is None: # global parent
+            gori = np.identity(3)
+        else:
+            gori = self.ori() @ self.attributes["parent"]._gori()
+        self._global_cache["gori"] = (Entity._version, gori)
+        return gori
     
     #TODO allow move to gpos?
     def move(self, pos=None, dpos=None, ori=None, dori=None):
@@ -149,21 +309,23 @@ class Entity:
              pos: Desired new origin. Shape (3) Numpy array or list.
              dpos: Desired origin delta vector. Shape (3) Numpy array or list.
              ori: Desired new new unit vectors. Shape (3, 3) np array or list. 
-             dori: Desired pyquaternion Quaternion to rotate csys. 
+             dori: Desired pyquaternion Quaternion to rotate csys, or its 
+                   Shape (3, 3) rotation matrix as a Numpy array or list. 
+
+         The pos & ori arrays are updated in place, so arrays previously
+         returned by pos() and ori() reflect the move.
          """
+         attributes = self.attributes
          if pos is not None:
-             self.attributes["pos"] = np.array(pos)
+             attributes["pos"][...] = pos
          elif dpos is not None:
-             self.attributes["pos"] += np.array(dpos)
+             attributes["pos"] += dpos
          if ori is not None:
-             self.attributes["ori"] = np.array(ori)
-         elif dori is not None:
-             self.attributes["ori"][:,0] = \
-                     dori.rotate(self.attributes["ori"][:,0])
-             self.attributes["ori"][:,1] = \
-                     dori.rotate(self.attributes["ori"][:,1])
-             self.attributes["ori"][:,2] = \
-                     dori.rotate(self.attributes["ori"][:,2])
+             attributes["ori"][...] = ori
+         elif dori is not None: # rotate each unit vector column at once
+             rotation = getattr(dori, "rotation_matrix", dori)
+             np.matmul(rotation, attributes["ori"], out=attributes["ori"])
+         self._invalidate()
     
     def add_to_image(self, img, resolution, origin):
         """ Adds this entity on the image specified, based on its visibility.
@@ -177,11 +339,64 @@ class Entity:
             if self.attributes["opacity"] == 1:
                 self.draw_self(img, resolution, origin)
             elif self.attributes["opacity"] > 0:
-                mask = copy.deepcopy(img) # Paint opaque version on here first
-                self.draw_self(mask, resolution, origin)
-                img[:,:,:] = cv2.addWeighted(img, 1 - self.get_opacity(),
+                # Only blend the region of the image this entity covers
+                height, width = img.shape[:2]
+                bbox = self.bbox(resolution, origin)
+                if bbox is None: # unknown; blend the whole image
+                    x0, y0, x1, y1 = 0, 0, width, height
+                else:
+                    x0, y0 = max(bbox[0], 0), max(bbox[1], 0)
+                    x1, y1 = min(bbox[2], width), min(bbox[3], height)
+                    if x0 >= x1 or y0 >= y1: # outside of image
+                        return
+                roi = img[y0:y1, x0:x1]
+                mask = roi.copy() # Paint opaque version on here first
+                self.draw_self(mask, resolution, 
+                        [origin[0] - x0, origin[1] - y0])
+                roi[:,:,:] = cv2.addWeighted(roi, 1 - self.get_opacity(),
                                       mask, self.get_opacity(), 0)
     
+    def batch_key(self):
+        """ Returns a key shared by entities which may be drawn together in one
+        batch by draw_batch. See add_all_to_image
+        
+        Returns:
+            Hashable key, or None if this entity must be drawn on its own.
+        """
+        return None
+    
+    def draw_batch(self, batch, img, resolution, origin):
+        """ Adds a batch of entities with this entity's batch_key to the image.
+        
+        Args:
+            batch: (list of Entity) Entities to add, including this entity
+            img: (3-element Numpy array) The bgr image to be drawn on
+            resolution: (float) Pixels per mm in the image
+            origin: (2-element list) The xy pixel values of the global origin
+        """
+        for entity in batch:
+            entity.add_to_image(img, resolution, origin)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this entity, as drawn by 
+        draw_self. Translucent entities are only blended within it.
+        Entities which override draw_self should also override bbox.
+        
+        Args:
+            resolution: (float) Pixels per mm in the image
+            origin: (2-element list) The xy pixel values of the global origin
+        
+        Returns:
+            [x0, y0, x1, y1] list of ints, x1 and y1 exclusive. 
+            None if unknown, in which case the whole image is assumed.
+        """
+        if type(self).draw_self is not Entity.draw_self: # unknown drawing
+            return None
+        return bbox_union([entity.bbox(resolution, origin) 
+                           for entity in self.attributes["components"]
+                           if entity.attributes["visible"] and 
+                           entity.attributes["opacity"] > 0])
+    
     def draw_self(self, img, resolution, origin):
         """ Draws a representation of this entity on the image specified.
         
@@ -190,8 +405,8 @@ class Entity:
             resolution: (float) Pixels per mm in the image
             origin: (2-element list) The xy pixel values of the global origin
         """
-        for entity in self.attributes["components"]:
-            entity.add_to_image(img, resolution, origin)
+        add_all_to_image(self.attributes["components"], img, resolution, 
+                origin)
             
     def add_components(self, *args):
         """ Adds subcomponent Entities to this Entity. 
@@ -199,18 +414,24 @@ class Entity:
             lists of Entites as arguments. 
             
         Args:
-            *args: Entities to add. Each argument can be a single Entity, or an
-                   iterable list of Entities.
+            *args: Entities to add. Each argument can be a single Entity, or a
+                   list or tuple of Entities.
         """
+        components = self.attributes["components"]
         for arg in args:
-            if isinstance(arg, Iterable): # argument is a list
-                for sub_arg in arg:
-                    self.add_components(sub_arg) # break it down recursively
-            else:
-                if not isinstance(arg, Entity):
-                    raise ValueError("%s is not an Entity." % arg)
-                self.attributes["components"].append(arg)
-                arg.attributes["parent"] = self
+            if isinstance(arg, Entity):
+                arg = (arg,)
+            elif not isinstance(arg, (list, tuple)):
+                raise ValueError("%s is not an Entity." % arg)
+            for entity in arg:
+                if isinstance(entity, Entity):
+                    components.append(entity)
+                    entity.attributes["parent"] = self
+                elif isinstance(entity, (list, tuple)): # nested list
+                    self.add_components(entity)
+                else:
+                    raise ValueError("%s is not an Entity." % entity)
+        self._invalidate()
                 
     def set_attribute(self, attribute, value):
         """ Sets the specified attribute of this Entity to the specified value.
@@ -219,7 +440,7 @@ class Entity:
             attribute: (string) attribute name to set
             value: (type varies) value to set this attribute to.
         """
-        self.attributes[attribute] = value
+        self.put(attribute, value)
     
     def get_opacity(self):
         """ Returns the total opacity of this entity (product of all parents).
@@ -227,10 +448,16 @@ class Entity:
         Returns:
             float 0-1: Total opacity of this entity
         """
+        cached = self._global_cache.get("opacity")
+        if cached is not None and cached[0] >= self._last_change():
+            return cached[1]
         if self.attributes["parent"] is None:
-            return self.attributes["opacity"]
-        return (self.attributes["opacity"] * 
-                self.attributes["parent"].get_opacity())
+            opacity = self.attributes["opacity"]
+        else:
+            opacity = (self.attributes["opacity"] * 
+                    self.attributes["parent"].get_opacity())
+        self._global_cache["opacity"] = (Entity._version, opacity)
+        return opacity
         
         
         
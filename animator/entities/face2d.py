@@ -5,8 +5,9 @@
 #
 
 
-from .entity import Entity
+from .entity import Entity, bbox_union
 from .contour2d import Contour2D, ArcContour2D, LineContour2D, CirContour2D
+from .contour2d import pixel_points_list
 ##from entity import Entity
 ##from contour2d import Contour2D, ArcContour2D, LineContour2D, CirContour2D
 import numpy as np
@@ -16,7 +17,9 @@ import cv2
 class Face2D(Entity):
     """ A 2d flat face. """
     
-    def __init__(self, contours=[], **kwargs):
+    __slots__ = ()
+    
+    def __init__(self, contours=(), **kwargs):
         """ Creates a new contour, consisting of a list of child contours. 
 
         Args:
@@ -29,19 +32,21 @@ class Face2D(Entity):
         
         See Entity.draw_self
         """
-        points_list = []
-        for contour in self.get("components"):
-            points = contour.jagged_points()
-            points = np.array([origin]) + points * [1, -1] * resolution  # px
-            ##points_list.append(points)
-            points_list.append(np.int32(points))
+        attributes = self.attributes
+        points_list = pixel_points_list(attributes["components"], 
+                resolution, origin)
         cv2.drawContours(img,
                          points_list,
                          ##np.int32(points_list),
                          -1,
-                         color=self.get("color"),
+                         color=attributes["color"],
                          thickness=cv2.FILLED,#self.get("size"),
                          lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this face. See Entity.bbox """
+        return bbox_union([contour.bbox(resolution, origin) 
+                           for contour in self.attributes["components"]])
 
 
 if __name__ == "__main__":
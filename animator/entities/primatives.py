@@ -5,11 +5,33 @@
 #
 
 
+import math
 import numpy as np
-from pyquaternion import Quaternion
 import cv2
-from .entity import Entity
-from ..funcs import convex
+from .entity import Entity, pixel_bbox
+from ..funcs import convex, project, to_pixels, FLIP_Y
+
+LINE_SHIFT = 8 # Fractional bits of the fixed point Line endpoints
+
+
+def _draw_circles(entities, img, resolution, origin, radius, color, thickness):
+    """ Draws a circle of the same style centered on each entity, projecting 
+    all of their centers to pixels at once. 
+    
+    Args:
+        entities: (list of Entity) Entities at the circle centers
+        img: (3-element Numpy array) The bgr image to be drawn on
+        resolution: (float) Pixels per mm in the image
+        origin: (2-element list) The xy pixel values of the global origin
+        radius: (int) Circle radius in pixels
+        color: (list) [b, g, r] color of circles
+        thickness: (int) Line thickness in pixels, or -1 for filled circles
+    """
+    centers = to_pixels([entity.gpos() for entity in entities], resolution, 
+            origin).tolist()
+    for center in centers:
+        cv2.circle(img, center, radius, color, thickness=thickness, 
+                   lineType=cv2.LINE_AA)
 
 
 class Point(Entity):
@@ -19,6 +41,8 @@ class Point(Entity):
             size = radius of point on the screen in pixels 
     """
     
+    __slots__ = ()
+    
     def __init__(self, coords, **kwargs):
         """ Creates a new point with the coordinates 'coords' of the form
             [x, y, z] specified in mm. """
@@ -29,21 +53,43 @@ class Point(Entity):
         
         See Entity.draw_self
         """
-        cv2.circle(img, (int(origin[0] + self.gpos()[0] * resolution), 
-                         int(origin[1] - self.gpos()[1] * resolution)), 
+        cv2.circle(img, to_pixels(self.gpos(), resolution, origin).tolist(), 
                          self.attributes["size"], self.attributes["color"], 
                          thickness=-1,
                          lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this point. See Entity.bbox """
+        center = project(self.gpos(), resolution, origin)
+        return pixel_bbox(center[None, :], self.attributes["size"] + 2)
+    
+    def batch_key(self):
+        """ Returns a key shared by opaque points of the same color and size.
+        See Entity.batch_key
+        """
+        attributes = self.attributes
+        if not attributes["visible"] or attributes["opacity"] != 1:
+            return None
+        return (type(self), tuple(attributes["color"]), attributes["size"])
+    
+    def draw_batch(self, batch, img, resolution, origin):
+        """ Draws a batch of points, projecting all their centers at once. 
+        See Entity.draw_batch
+        """
+        _draw_circles(batch, img, resolution, origin, self.attributes["size"],
+                self.attributes["color"], -1)
 
 
 class P(Point):
     """ Alias for Point. """
-    pass
+    __slots__ = ()
     
     
 class Edge(Entity):
     """ A 1D curve. """
     
+    __slots__ = ()
+    
     def __init__(self, **kwargs):
         """ Creates a new edge.
         """
@@ -59,6 +105,8 @@ class Line(Edge):
         size = thickness of line on the screen in pixels
     """
     
+    __slots__ = ()
+    
     def __init__(self, coords, slope, **kwargs):
         """ Creates a new Line. 
         
@@ -68,26 +116,36 @@ class Line(Edge):
         """
         super().__init__(**kwargs)
         self.attributes["p"] = Point(coords)
-        self.attributes["slope"] = np.array(slope)
+        self.attributes["slope"] = np.array(slope, dtype=np.float32)
         
     def draw_self(self, img, resolution, origin): 
         """ Draws this line on the image specified.
         
         See Entity.draw_self
         """
-        stretch_factor = 999999 # to create stretched line endpoints that 
-                                # will exceed the image window (sloppy)
-        p0_stretched = (self.attributes["p"].gpos() +
-                stretch_factor * self.attributes["slope"])
-        p1_stretched = (self.attributes["p"].gpos() -
-                stretch_factor * self.attributes["slope"])
-        cv2.line(img, (int(origin[0] + p0_stretched[0] * resolution),
-                       int(origin[1] - p0_stretched[1] * resolution)),
-                      (int(origin[0] + p1_stretched[0] * resolution),
-                       int(origin[1] - p1_stretched[1] * resolution)),
-                       self.attributes["color"], 
-                       thickness=self.attributes["size"], 
-                       lineType=cv2.LINE_AA)
+        attributes = self.attributes
+        height, width = img.shape[:2]
+        margin = attributes["size"] + 2 # so line ends are never visible
+        # Point & direction of line in pixels, as float64 for precision
+        p = project(attributes["p"].gpos().astype(np.float64), resolution, 
+                origin)
+        slope = attributes["slope"][:2] * FLIP_Y.astype(np.float64)
+        if not slope.any(): # perpendicular to the image; nothing to draw
+            return
+        # Extend line just past the image corners, rather than indefinitely
+        corners = np.array([[-margin, -margin], [width + margin, -margin], 
+                [-margin, height + margin], [width + margin, height + margin]])
+        t = (corners - p) @ slope / (slope @ slope)
+        ends = p + np.array([[t.min()], [t.max()]]) * slope
+        # Clip to the image in fixed point, keeping sub-pixel accuracy
+        p0, p1 = np.round(ends * (1 << LINE_SHIFT)).astype(int).tolist()
+        visible, p0, p1 = cv2.clipLine(((-margin) << LINE_SHIFT, 
+                (-margin) << LINE_SHIFT, (width + 2*margin) << LINE_SHIFT, 
+                (height + 2*margin) << LINE_SHIFT), p0, p1)
+        if visible:
+            cv2.line(img, p0, p1, attributes["color"], 
+                     thickness=attributes["size"], lineType=cv2.LINE_AA, 
+                     shift=LINE_SHIFT)
 
 
 class Line_Seg(Edge):
@@ -100,6 +158,8 @@ class Line_Seg(Edge):
         size = thickness of line on the screen in pixels
     """
     
+    __slots__ = ()
+    
     def __init__(self, coords_start, coords_end, **kwargs):
         """ Creates a new Line Segment. 
         
@@ -126,15 +186,28 @@ class Line_Seg(Edge):
         """
         return self.attributes["components"][1]
     
+    def _delta(self):
+        """ Returns the cached vector from start to end point & its length.
+        Recalculated only if this segment has changed since. See Entity._version
+        
+        Returns:
+            (Shape (3) numpy array, float); must not be modified.
+        """
+        cached = self._global_cache.get("delta")
+        if cached is not None and cached[0] >= self._last_change():
+            return cached[1]
+        delta = self.end().pos() - self.start().pos()
+        delta = (delta, math.hypot(*delta))
+        self._global_cache["delta"] = (Entity._version, delta)
+        return delta
+    
     def length(self):
         """ Returns the length of this Line Segment. 
         
         Returns:
             A float containing the distance between the two endpoints.
         """
-        return ((self.end().pos()[0] - self.start().pos()[0]) ** 2 + 
-                (self.end().pos()[1] - self.start().pos()[1]) ** 2 + 
-                (self.end().pos()[2] - self.start().pos()[2]) ** 2) ** 0.5
+        return self._delta()[1]
     
     def slope(self):
         """ Returns the unit vector in direction from start point to end point.
@@ -143,25 +216,56 @@ class Line_Seg(Edge):
         Returns:
             Shape (3) numpy array, representing unit vector from start to end.
         """
-        return np.array(self.end().pos() - self.start().pos()) / self.length()
+        delta, length = self._delta()
+        return delta / length
         
     def draw_self(self, img, resolution, origin): 
         """ Draws this line on the image specified.
         
         See Entity.draw_self
         """
-        cv2.line(img, (int(origin[0] + self.start().gpos()[0] * resolution),
-                       int(origin[1] - self.start().gpos()[1] * resolution)),
-                      (int(origin[0] + self.end().gpos()[0] * resolution),
-                       int(origin[1] - self.end().gpos()[1] * resolution)),
+        start, end = to_pixels([self.start().gpos(), self.end().gpos()], 
+                resolution, origin).tolist()
+        cv2.line(img, start, end,
                        self.attributes["color"], 
                        thickness=self.attributes["size"], 
                        lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this line segment. 
+        See Entity.bbox 
+        """
+        ends = np.array([self.start().gpos()[:2], self.end().gpos()[:2]])
+        return pixel_bbox(project(ends, resolution, origin), 
+                self.attributes["size"] + 2)
+    
+    def batch_key(self):
+        """ Returns a key shared by opaque segments of the same color and size.
+        See Entity.batch_key
+        """
+        attributes = self.attributes
+        if not attributes["visible"] or attributes["opacity"] != 1:
+            return None
+        return (type(self), tuple(attributes["color"]), attributes["size"])
+    
+    def draw_batch(self, batch, img, resolution, origin):
+        """ Draws a batch of line segments with one cv2.polylines call. 
+        See Entity.draw_batch
+        """
+        ends = [[segment.start().gpos(), segment.end().gpos()] 
+                for segment in batch]
+        cv2.polylines(img, to_pixels(ends, resolution, origin), 
+                      isClosed=False,
+                      color=self.attributes["color"], 
+                      thickness=self.attributes["size"], 
+                      lineType=cv2.LINE_AA)
 
 
 class Circle(Edge):
     """ A 1D circular curve. """
     
+    __slots__ = ()
+    
     def __init__(self, radius, **kwargs):
         """ Creates a new Circle in the xy-plane.
         
@@ -175,12 +279,36 @@ class Circle(Edge):
         
         See Entity.draw_self
         """
-        cv2.circle(img, (int(origin[0] + self.gpos()[0] * resolution), 
-                         int(origin[1] - self.gpos()[1] * resolution)), 
+        cv2.circle(img, to_pixels(self.gpos(), resolution, origin).tolist(), 
                          int(self.attributes["radius"] * resolution), 
                          self.attributes["color"], 
                          thickness=self.attributes["size"],
                          lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this circle. See Entity.bbox """
+        center = project(self.gpos(), resolution, origin)
+        return pixel_bbox(center[None, :], 
+                int(self.attributes["radius"] * resolution) + 
+                self.attributes["size"] + 2)
+    
+    def batch_key(self):
+        """ Returns a key shared by opaque circles of the same color, radius, 
+        and size. See Entity.batch_key
+        """
+        attributes = self.attributes
+        if not attributes["visible"] or attributes["opacity"] != 1:
+            return None
+        return (type(self), tuple(attributes["color"]), attributes["radius"], 
+                attributes["size"])
+    
+    def draw_batch(self, batch, img, resolution, origin):
+        """ Draws a batch of circles, projecting all their centers at once. 
+        See Entity.draw_batch
+        """
+        _draw_circles(batch, img, resolution, origin, 
+                int(self.attributes["radius"] * resolution), 
+                self.attributes["color"], self.attributes["size"])
         
 
 class Face(Entity):
@@ -191,21 +319,26 @@ class Face(Entity):
         boundary_color: list [b, g, r] representing color of boundary edges. 
     """
     
-    def __init__(self, boundary=[], boundary_color=[255, 255, 255], **kwargs):
+    __slots__ = ()
+    
+    def __init__(self, boundary=None, boundary_color=[255, 255, 255], 
+            **kwargs):
         """ Creates a new abstract face.
         
         Args:
-            boundary: list of Edges making up periphery
+            boundary: list of Edges making up periphery. Default None, empty.
             boundary_color: list [b, g, r] representing color of boundary edges.
         """
         super().__init__(**kwargs)
-        self.attributes["boundary"] = boundary
+        self.attributes["boundary"] = [] if boundary is None else boundary
         self.attributes["boundary_color"] = boundary_color
                 
 
 class Disk(Face):
     """ A 2D filled planar circular region. """
     
+    __slots__ = ()
+    
     def __init__(self, radius, **kwargs):
         """ Creates a new Disk in the xy-plane.
         
@@ -219,18 +352,42 @@ class Disk(Face):
         
         See Entity.draw_self
         """
-        cv2.circle(img, (int(origin[0] + self.gpos()[0] * resolution), 
-                         int(origin[1] - self.gpos()[1] * resolution)), 
+        cv2.circle(img, to_pixels(self.gpos(), resolution, origin).tolist(), 
                          int(self.attributes["radius"] * resolution), 
                          self.attributes["color"], 
                          thickness=-1,
                          lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this disk. See Entity.bbox """
+        center = project(self.gpos(), resolution, origin)
+        return pixel_bbox(center[None, :], 
+                int(self.attributes["radius"] * resolution) + 2)
+    
+    def batch_key(self):
+        """ Returns a key shared by opaque disks of the same color and radius.
+        See Entity.batch_key
+        """
+        attributes = self.attributes
+        if not attributes["visible"] or attributes["opacity"] != 1:
+            return None
+        return (type(self), tuple(attributes["color"]), attributes["radius"])
+    
+    def draw_batch(self, batch, img, resolution, origin):
+        """ Draws a batch of disks, projecting all their centers at once. 
+        See Entity.draw_batch
+        """
+        _draw_circles(batch, img, resolution, origin, 
+                int(self.attributes["radius"] * resolution), 
+                self.attributes["color"], -1)
 
 
 #TODO: Extend to annulus?         
 class Wedge(Face):
     """ A 2D filled planar circular wedge, with start & end angle. """
     
+    __slots__ = ()
+    
     def __init__(self, radius, start_ang, end_ang, **kwargs):
         """ Creates a new Wedge in the xy-plane.
         
@@ -248,25 +405,36 @@ class Wedge(Face):
         
         See Entity.draw_self
         """
-        cv2.ellipse(img, (int(origin[0] + self.gpos()[0] * resolution), 
-                          int(origin[1] - self.gpos()[1] * resolution)), 
-                         (int(self.attributes["radius"] * resolution),
-                          int(self.attributes["radius"] * resolution)), 
+        attributes = self.attributes
+        radius = int(attributes["radius"] * resolution)
+        cv2.ellipse(img, to_pixels(self.gpos(), resolution, origin).tolist(), 
+                          (radius, radius), 
                           0,
-                          360. - self.attributes["start_ang"] * 180 / np.pi,
-                          360. - self.attributes["end_ang"] * 180 / np.pi,
-                          self.attributes["color"], 
+                          360. - math.degrees(attributes["start_ang"]),
+                          360. - math.degrees(attributes["end_ang"]),
+                          attributes["color"], 
                           thickness=-1,
                           lineType=cv2.LINE_AA)
     
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of the full circle of this wedge. 
+        See Entity.bbox 
+        """
+        center = project(self.gpos(), resolution, origin)
+        return pixel_bbox(center[None, :], 
+                int(self.attributes["radius"] * resolution) + 2)
+    
     
 class Polygon(Face):
     """ A 2D planar polygonal surface. 
     
     Attributes:
         "convex" - True if points form a convex shape.  #TODO 3d convexity
+                   None until first drawn. 
     """
     
+    __slots__ = ()
+    
     def __init__(self, points, **kwargs):
         """ Creates a new polygon from the list 'points' given. 
         
@@ -275,38 +443,73 @@ class Polygon(Face):
                            consecutively ordered according to the geometry. 
         """
         super().__init__(components=points, **kwargs)
-        self.attributes["convex"] = convex(self) 
+        self.attributes["convex"] = None # evaluated when first drawn
                 #TODO Re-check if pts change
     
     def get_points(self):
         """ Returns all points of this polygon, in global coordinate system.
+        The array is cached until the polygon next changes; do not modify it.
         # TODO only implemented for 2d (x, y, 0)
         returns:
-            Shape (N, 3) numpy array, [x, y, 0] coords on axis 2
+            Shape (1, N, 3) numpy array, [x, y, 0] coords on axis 2
         """
-        points_list = []
-        for point in self.attributes["components"]:
-            points_list.append([point.gpos()[0], point.gpos()[1], 0]) 
-        return np.array([points_list])
+        cached = self._global_cache.get("points")
+        if cached is not None and cached[0] >= self._last_change():
+            return cached[1]
+        # Vertices are in this polygon's csys; transform them all at once
+        pos, rot = self._global_transform()
+        points = np.stack([point.pos() for point in 
+                           self.attributes["components"]]) @ rot.T
+        points += pos
+        points = points.astype(np.float64)
+        points[:, 2] = 0
+        points = points[None]
+        self._global_cache["points"] = (Entity._version, points)
+        return points
+    
+    def get_pixel_points(self, resolution, origin):
+        """ Returns all points of this polygon in image pixels. Cached, as 
+        get_points, for the last resolution and origin; do not modify it. 
+        
+        Args:
+            resolution: (float) Pixels per mm in the image
+            origin: (2-element list) The xy pixel values of the global origin
+        
+        Returns:
+            Shape (1, N, 2) int32 numpy array, xy pixel coords on axis 2
+        """
+        key = (resolution, tuple(origin))
+        cached = self._global_cache.get("pixels")
+        if (cached is not None and cached[0] >= self._last_change() and 
+                cached[1][0] == key):
+            return cached[1][1]
+        pixel_points = to_pixels(self.get_points(), resolution, origin)
+        self._global_cache["pixels"] = (Entity._version, (key, pixel_points))
+        return pixel_points
         
     def draw_self(self, img, resolution, origin): 
         """ Draws an opaque filled version of this Polygon on image specified.
         
         See Entity.draw_self
         """
-        pixel_points = (self.get_points()[:,:,:2] * [1, -1] * resolution +
-                            origin).astype("int32")
-        if self.attributes["convex"]:
-            cv2.fillConvexPoly(img, pixel_points, self.attributes["color"],
-                    lineType=cv2.LINE_AA)        
-        else:
-            cv2.fillPoly(img, pixel_points, self.attributes["color"],
-                    lineType=cv2.LINE_AA)
+        attributes = self.attributes
+        if attributes["convex"] is None:
+            attributes["convex"] = convex(self)
+        fill = cv2.fillConvexPoly if attributes["convex"] else cv2.fillPoly
+        fill(img, self.get_pixel_points(resolution, origin), 
+             attributes["color"], lineType=cv2.LINE_AA)
+    
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this polygon. See Entity.bbox """
+        return pixel_bbox(project(self.get_points()[0], resolution, 
+                origin), 2)
                 
                 
 class Text(Entity):
     """ A field of text. """
     
+    __slots__ = ()
+    
     def __init__(self, text, scale=1, **kwargs): 
         """ Creates a new text field. 
         
@@ -319,14 +522,26 @@ class Text(Entity):
         self.attributes["scale"] = scale
         
     def draw_self(self, img, resolution, origin): # TODO Text rotation
-        cv2.putText(img, self.attributes["text"], 
-                         (int(origin[0] + self.gpos()[0] * resolution),
-                          int(origin[1] - self.gpos()[1] * resolution)),
+        attributes = self.attributes
+        cv2.putText(img, attributes["text"], 
+                         to_pixels(self.gpos(), resolution, origin).tolist(),
                          cv2.FONT_HERSHEY_SIMPLEX,
-                         self.attributes["scale"] * resolution,
-                         self.attributes["color"],
-                         thickness=self.attributes["size"], 
+                         attributes["scale"] * resolution,
+                         attributes["color"],
+                         thickness=attributes["size"], 
                          lineType=cv2.LINE_AA)
     
+    def bbox(self, resolution, origin):
+        """ Returns the pixel bounding box of this text. See Entity.bbox """
+        attributes = self.attributes
+        (width, height), baseline = cv2.getTextSize(attributes["text"], 
+                cv2.FONT_HERSHEY_SIMPLEX, 
+                attributes["scale"] * resolution, 
+                attributes["size"])
+        corner = project(self.gpos(), resolution, origin)
+        return pixel_bbox(np.array([corner + [0, -height], 
+                                    corner + [width, baseline]]), 
+                attributes["size"] + 2)
+    
     
     
@@ -4,10 +4,63 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from sympy import Point as SymPoint
-from sympy import Polygon as SymPolygon
 
 
+# Flips the y axis from the global csys (y up) to image pixels (y down)
+FLIP_Y = np.array([1., -1.], dtype=np.float32)
+
+
+def project(points, resolution, origin):
+    """ Returns the unrounded image pixel coordinates of points in the global 
+    csys, i.e. the affine map x' = res * x + ox, y' = -res * y + oy. 
+    Calculated in the precision of the points given. 
+    
+    Args:
+        points: Shape (..., 2) or (..., 3) Numpy array; global coords, mm
+        resolution: (float) Pixels per mm in the image
+        origin: (2-element list) The xy pixel values of the global origin
+    
+    Returns:
+        Shape (..., 2) float Numpy array; xy pixel coordinates
+    """
+    pixels = np.asarray(points)[..., :2] * FLIP_Y * resolution
+    pixels += np.asarray(origin, dtype=pixels.dtype)
+    return pixels
+
+
+def to_pixels(points, resolution, origin):
+    """ Returns the image pixel coordinates of points in the global csys.
+    Calculated in the precision of the points given, and truncated towards
+    zero as int() does. 
+    
+    Args:
+        points: Shape (..., 2) or (..., 3) Numpy array; global coords, mm
+        resolution: (float) Pixels per mm in the image
+        origin: (2-element list) The xy pixel values of the global origin
+    
+    Returns:
+        Shape (..., 2) int32 Numpy array; xy pixel coordinates
+    """
+    return project(points, resolution, origin).astype(np.int32)
+
+
+def rotation_matrices(axis, angles):
+    """ Returns the rotation matrices about an axis for each angle, computed
+    together with the Rodrigues formula R = I + sin(a) K + (1 - cos(a)) K^2.
+    
+    Args:
+        axis: (3-element list or Numpy array) Rotation axis; need not be unit
+        angles: (float or Numpy array) Counter-clockwise rotation angles, rad
+    
+    Returns:
+        Shape (np.shape(angles), 3, 3) Numpy array; rotation matrices
+    """
+    x, y, z = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    k = np.array([[0, -z, y], 
+                  [z, 0, -x], 
+                  [-y, x, 0]]) # cross product matrix of the axis
+    angles = np.asarray(angles, dtype=np.float64)[..., None, None]
+    return np.identity(3) + np.sin(angles) * k + (1 - np.cos(angles)) * (k @ k)
 
 
 def span(start, end, n_elems, profile="sigmoid"):
@@ -33,22 +86,34 @@ def span(start, end, n_elems, profile="sigmoid"):
     if n_elems <= 1:
         shape = np.array([1.])
     else:    
-        # Create distribution shape, from 0 - 1:
+        # Create distribution shape, from 0 - 1, in place on one array:
         if profile == "linear":
             shape = np.linspace(0, 1, n_elems)
         elif profile == "quadratic":
-            shape = (np.linspace(0, 1, n_elems)) ** 2
+            shape = np.linspace(0, 1, n_elems)
+            np.square(shape, out=shape)
         elif profile == "neg_quadratic":
-            shape = 1 - (np.linspace(1, 0, n_elems)) ** 2
+            shape = np.linspace(1, 0, n_elems)
+            np.square(shape, out=shape)
+            np.subtract(1, shape, out=shape)
         elif profile == "sinusoid":
-            shape = 0.5 - np.cos(np.linspace(0, np.pi, n_elems)) / 2
+            shape = np.linspace(0, np.pi, n_elems)
+            np.cos(shape, out=shape)
+            shape /= 2
+            np.subtract(0.5, shape, out=shape)
         else: #if profile == "sigmoid":
-            shape = 1/(1 + np.exp(-10 * np.linspace(-.5, .5, n_elems)))
-        # Artificially round end points:
-        shape -= shape[0]
-        shape *= 1.0 / shape[-1]
-    
-    return start + np.outer(shape, (end - start))
+            shape = np.linspace(-.5, .5, n_elems)
+            shape *= -10
+            np.exp(shape, out=shape)
+            shape += 1
+            np.reciprocal(shape, out=shape)
+        # Artificially round end points (already exact for linear):
+        if profile != "linear":
+            shape -= shape[0]
+            shape *= 1.0 / shape[-1]
+    
+    # Broadcast equivalent of np.outer(shape, end - start)
+    return start + shape[:, None] * np.ravel(end - start)
 
 
 
@@ -59,11 +124,20 @@ def convex(poly):
     Returns:
         (boolean) convexity status of Polygon points. 
     """
-    sympoints = []
-    for point in poly.attributes["components"]:
-        sympoints.append(SymPoint((point.pos()[0], point.pos()[1])))
-    sympoly = SymPolygon(*sympoints)
-    return sympoly.is_convex()
+    points = np.array([point.pos()[:2] 
+                       for point in poly.attributes["components"]], np.float64)
+    edges = np.roll(points, -1, axis=0) - points
+    edges = edges[(edges != 0).any(axis=1)] # skip repeated points
+    next_edges = np.roll(edges, -1, axis=0)
+    # z of the cross product of consecutive edges; one sign if turning one way
+    cross = edges[:, 0] * next_edges[:, 1] - edges[:, 1] * next_edges[:, 0]
+    if not ((cross >= 0).all() or (cross <= 0).all()):
+        return False
+    dot = np.einsum("ij,ij->i", edges, next_edges)
+    if ((cross == 0) & (dot < 0)).any(): # doubles back on itself
+        return False
+    # Turning one way but winding more than once (e.g. a star) self-intersects
+    return bool(abs(np.arctan2(cross, dot).sum()) < 3 * np.pi)
 
 
 
@@ -84,37 +158,46 @@ def dist_to_poly(poly, point, dir):
                 -np.inf if backwards intersection, but no forwards intersection
     """
     
+    return _ray_poly_dist(poly.get_points()[0], point.gpos(), np.asarray(dir))
+
+
+def _ray_poly_dist(vertices, origin, dir):
+    """ Numeric core of dist_to_poly, evaluated for all polygon edges at once.
+    
+    Args:
+        vertices  Shape (N, 3) np.array  Polygon vertices, consecutively ordered
+        origin    Shape (3) np.array     Point to measure distance from
+        dir       Shape (3) np.array     Direction vector from origin
+    
+    Returns:
+        float: See dist_to_poly
+    """
+    
     # Ensure dir is normalized
     a = dir / np.linalg.norm(dir)
     
-    # Construct normal to direction line
-    n = np.array([-a[1], a[0], 0])
-    
-    # Measure distance of each line segment to the ray coming from point.  
-    # Ignore line segments that do not intersect point. 
-    min_line_fwd_dist = np.inf
-    inside_factor = 1
-    vertices = poly.get_points()[0]
-    for i in range(len(vertices)):
-        start = vertices[i]
-        end = vertices[(i+1) % len(vertices)]
-        norm_start = np.dot(n, start - point.gpos())
-        norm_end = np.dot(n, end - point.gpos())
-        ax_start = np.dot(a, start - point.gpos())
-        ax_end = np.dot(a, end - point.gpos())
-        
-        if norm_start * norm_end > 0:
-            continue  # same sign; no intersection
-        else:
-            fwd_dist = ax_start + ((0 - norm_start) / (norm_end - norm_start) * 
-                    (ax_end - ax_start))
-            if fwd_dist < 0:
-                inside_factor = -1  # must be inside polygon
-                continue
-            if fwd_dist < min_line_fwd_dist:
-                min_line_fwd_dist = fwd_dist
-    
-    return inside_factor * min_line_fwd_dist
+    # Project each vertex onto the normal [-a_y, a_x, 0] & axial directions
+    # of the ray. 
+    rel = vertices - origin
+    norm_start = rel[:, 1] * a[0] - rel[:, 0] * a[1]
+    ax_start = rel @ a
+    norm_end = np.roll(norm_start, -1)  # edge i runs from vertex i to i + 1
+    ax_end = np.roll(ax_start, -1)
+    
+    # Ignore line segments that do not intersect point (same sign), then 
+    # measure distance of the rest to the ray coming from point.  
+    crossing = norm_start * norm_end <= 0
+    norm_start, norm_end = norm_start[crossing], norm_end[crossing]
+    ax_start, ax_end = ax_start[crossing], ax_end[crossing]
+    with np.errstate(divide="ignore", invalid="ignore"): # parallel edges
+        fwd_dists = ax_start + (0 - norm_start) / (norm_end - norm_start) * (
+                ax_end - ax_start)
+    
+    inside_factor = -1 if np.any(fwd_dists < 0) else 1 # must be inside polygon
+    fwd_dists = fwd_dists[fwd_dists >= 0]
+    if len(fwd_dists) == 0:
+        return inside_factor * np.inf
+    return inside_factor * np.min(fwd_dists)
     
     
 if __name__ == '__main__':
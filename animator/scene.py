@@ -5,6 +5,9 @@
 import cv2
 from copy import deepcopy
 import numpy as np
+import queue
+import threading
+from .entities.entity import add_all_to_image
 
 class Scene:
     """ Represents the scene in which the animation takes place. 
@@ -19,12 +22,17 @@ class Scene:
         origin: Point on image in pixels of the coordinate system origin.
                 [int, int] list in the form width, height
         script: Dictonary in the form frame_no : instructions, where frame_no is
-                an int and instructions is a list executable python strings.
+                an int and instructions is a list of executable python strings
+                or callables taking this scene as their only argument.
+        sweeps: Dictionary in the form frame_start : sweeps, where sweeps is a
+                list of attribute sweeps starting at that frame, each a tuple
+                in the form (order, entity_alias, attribute, values). One value
+                is applied per frame, in the order the script was written.
         current_frame: (int) Current frame number present on scene
         fps: Frames per second of animation. 
     """
     
-    def __init__(self, width, height, resolution, fps, entities={}, 
+    def __init__(self, width, height, resolution, fps, entities=None, 
             background=[0, 0, 0]): 
         """ Creates a new scene. 
         Args:
@@ -34,9 +42,12 @@ class Scene:
             entities: (dict) Dictionary of string : Entity, where key is a 
                       string alias for a particular Entity on the scene.
                       Entities are provided in initial configuration. 
+                      Default None, an empty scene.
             background: (3-element list) Background color of the scene, bgr
             fps: (int) Frames per second of animation. 
         """
+        if entities is None: # a new dict, not one shared between scenes
+            entities = {}
         self.width = width
         self.height = height
         self.resolution = resolution # px/mm
@@ -45,6 +56,12 @@ class Scene:
         self.background = background
         self.origin = [width // 2, height // 2]
         self.script = {}
+        self._compiled = {} # string instruction : its compiled code object
+        self._orders = {} # frame_no : order each instruction was written in
+        self.sweeps = {}
+        self._active_sweeps = [] # (order, frame_end, alias, attribute, values)
+        self._next_order = 0 # order of the next instruction or sweep written
+        self._end_frame = 0 # last frame with an instruction or sweep value
         self.current_frame = 0
         self.fps = fps
         
@@ -63,10 +80,11 @@ class Scene:
         
     
     def reset(self):
-        """ Reverts to frame 0. Overwrites Entities with saved initial values.
+        """ Reverts to frame 0. Replaces Entities with copies of saved initial 
+        values, copied together so Entities shared between aliases stay shared.
         """
-        for i in range(len(self.entities)):
-            self.entities[i] = deepcopy(self.entities_init[i])
+        self.entities = deepcopy(self.entities_init)
+        self._active_sweeps = []
         self.current_frame = 0
     
     def add_instruction(self, frame_no, instruction):
@@ -76,10 +94,40 @@ class Scene:
             frame_no: Frame number in animation to add instruction.
             instruction: (string) A snippet of executable python code. 
                          Most commonly a function call modifying an object.
+                         May also be a callable, called with this scene.
         """
         if frame_no not in self.script:
             self.script[frame_no] = []
+            self._orders[frame_no] = []
+            self._end_frame = max(self._end_frame, frame_no)
         self.script[frame_no].append(instruction)
+        self._orders[frame_no].append(self._next_order)
+        self._next_order += 1
+    
+    def add_sweep(self, frame_start, entity_alias, attribute, values):
+        """ Adds an attribute sweep to the script. 
+        values[0] is applied at frame_start, values[1] at the next frame, etc.
+        
+        Args:
+            frame_start: Frame number in animation to apply the first value.
+            entity_alias: (string) Alias of Entity whose attribute is swept.
+            attribute: (string) Attribute name to change.
+            values: (list or Numpy array) Attribute value at each frame.
+        """
+        self._end_frame = max(self._end_frame, frame_start + len(values) - 1)
+        if len(values) == 0: # nothing to apply
+            return
+        self.sweeps.setdefault(frame_start, []).append(
+                (self._next_order, entity_alias, attribute, values))
+        self._next_order += 1
+    
+    def end_frame(self):
+        """ Returns the last frame number with an instruction or sweep value.
+        
+        Returns:
+            (int) Final frame number of the animation.
+        """
+        return self._end_frame
     
     # TODO able to play animation backwards?
     def set_frame_no(self, frame_no, display=False): 
@@ -93,62 +141,155 @@ class Scene:
         """
         if frame_no < self.current_frame: # Need to reset to start
             self.reset()
+        script = self.script
+        active = self._active_sweeps # sweeps with a value at this step
         for i in range(self.current_frame, frame_no):
-            if i in self.script: # instructions specified at this step
-                for instruction in self.script[i]:
-                    try:
-                        exec(instruction)
-                    except Exception as e:
-                        print("FAILED to execute instruction")
-                        print("frame no: ", i)
-                        print("time: ", i / self.fps)
-                        print("instruction: ", '"' + instruction + '"')
-                        print()
-                        raise e
+            started = self.sweeps.get(i)
+            if started is not None: # sweeps starting at this step
+                active.extend((order, i + len(values) - 1, alias, attribute,
+                               values)
+                              for order, alias, attribute, values in started)
+                active.sort(key=lambda sweep: sweep[0])
+            # Apply sweep values & instructions in the order they were written
+            k = 0
+            instructions = script.get(i)
+            if instructions is not None: # instructions specified at this step
+                for order, instruction in zip(self._orders[i], instructions):
+                    while k < len(active) and active[k][0] < order:
+                        self._apply_sweep(active[k], i)
+                        k += 1
+                    self._execute(instruction, i)
+            for sweep in active[k:]:
+                self._apply_sweep(sweep, i)
+            if active: # drop sweeps that have ended
+                active[:] = [sweep for sweep in active if sweep[1] > i]
         self.current_frame = frame_no
         if display:
             cv2.imshow(str(frame_no), img)
             cv2.waitKey(-1)
             cv2.destroyAllWindows()
     
-    def capture_frame(self):
+    def _execute(self, instruction, frame_no):
+        """ Executes a single script instruction, see add_instruction. """
+        try:
+            if callable(instruction):
+                instruction(self)
+            else: # compile each distinct string only once
+                code = self._compiled.get(instruction)
+                if code is None:
+                    code = compile(instruction, "<script>", "exec")
+                    self._compiled[instruction] = code
+                exec(code)
+        except Exception as e:
+            print("FAILED to execute instruction")
+            print("frame no: ", frame_no)
+            print("time: ", frame_no / self.fps)
+            print("instruction: ", repr(instruction))
+            print()
+            raise e
+    
+    def _apply_sweep(self, sweep, frame_no):
+        """ Sets a swept attribute to its value at frame_no. """
+        order, frame_end, alias, attribute, values = sweep
+        self.entities[alias].set_attribute(attribute,
+                values[frame_no - frame_end + len(values) - 1])
+    
+    def capture_frame(self, img=None):
         """ Returns an image corresponding to the current state of the scene.
+        
+        Args:
+            img: Shape (height, width, 3) uint8 Numpy array to capture into, 
+                 overwriting its contents. Default None, a new image.
 
         Returns:
             Shape (height, width, 3) Numpy array; captured image
         """
         
-        # Create image & apply background
-        img = np.zeros([self.height, self.width, 3], np.uint8) # blank bgr image
+        # Create bgr image & fill it with background in a single pass.
+        # cv2 fills a 3-channel color much faster than np.full broadcasts it
+        if img is None:
+            img = np.empty([self.height, self.width, 3], np.uint8)
         cv2.rectangle(img, (0, 0), (self.width-1, self.height-1),
-                self.background, -1) # apply background
+                self.background, -1)
         # Capture each entity in scene. 
-        # Order in list determines order on screen.
-        for alias, entity in self.entities.items():
-            entity.add_to_image(img, self.resolution, self.origin)
+        # Order in list determines order on screen. 
+        add_all_to_image(self.entities.values(), img, self.resolution, 
+                self.origin)
         return img
         
-    def get_frames(self, start_frame=0, end_frame=None, status=True):
-        """ Returns a list of frames from playing back the scene.
+    def get_frames(self, start_frame=0, end_frame=None, status=True, 
+            buffers=None):
+        """ Yields the frames from playing back the scene, one at a time.
+        Each frame is captured only once the previous has been consumed.
         
         Args:
-            start_frame: Initial frame in outputted list. Default 0 (beginning). 
-            end_frame: Final frame in outputted list. Default None (end)
+            start_frame: Initial frame yielded. Default 0 (beginning). 
+            end_frame: Final frame yielded. Default None (end)
             status (bool): If True, prints completion status to terminal.
+            buffers: (list) Images to capture into in turn, see capture_frame.
+                     A yielded frame is overwritten len(buffers) frames later.
+                     Default None, a new image for every frame.
             
-        Returns:
-            list of shape (height, width, 3) frame images 
+        Yields:
+            shape (height, width, 3) frame images 
         """
         if end_frame is None: # Output to end of animation
-            end_frame = max(self.script.keys())
-        frames = []
+            end_frame = self.end_frame()
         for i in range(start_frame, end_frame + 1):
             if status:
                 if i % 10 == 0 or i == end_frame:
                     print("Getting frame no %i of %i" % (i, end_frame))
             self.set_frame_no(i)
-            frames.append(self.capture_frame())
-        return frames
-            
-            
+            if buffers is None:
+                yield self.capture_frame()
+            else:
+                yield self.capture_frame(buffers[(i - start_frame) % 
+                                                 len(buffers)])
+    
+    def write_video(self, filename, start_frame=0, end_frame=None, 
+            status=True, fourcc="mp4v", buffer_size=16):
+        """ Plays back the scene and writes its frames to a video file. 
+        Frames are encoded on a separate thread while the next are captured, 
+        with at most buffer_size frames awaiting encoding. Frames are captured 
+        into a fixed set of images, reused once encoded.
+        
+        Args:
+            filename: (string) Path of the video file to write.
+            start_frame: Initial frame written. Default 0 (beginning). 
+            end_frame: Final frame written. Default None (end)
+            status (bool): If True, prints completion status to terminal.
+            fourcc: (string) Four character code of the video codec.
+            buffer_size: (int) Max number of captured frames awaiting encoding.
+        """
+        out = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), 
+                self.fps, (self.width, self.height))
+        frames = queue.Queue(maxsize=buffer_size)
+        errors = [] # exception raised while writing, reraised by the caller
+        
+        def write_frames():
+            frame = frames.get()
+            while frame is not None: # None marks the end of the video
+                if not errors: # once failed, only drain so puts don't block
+                    try:
+                        out.write(frame)
+                    except Exception as e:
+                        errors.append(e)
+                frame = frames.get()
         
+        # Enough images for those queued, one being written & one captured
+        buffers = [np.empty([self.height, self.width, 3], np.uint8) 
+                   for _ in range(buffer_size + 2)]
+        writer = threading.Thread(target=write_frames)
+        writer.start()
+        try:
+            for frame in self.get_frames(start_frame, end_frame, status, 
+                                         buffers):
+                if errors: # stop capturing frames that won't be written
+                    break
+                frames.put(frame)
+        finally:
+            frames.put(None)
+            writer.join()
+            out.release()
+        if errors:
+            raise errors[0]
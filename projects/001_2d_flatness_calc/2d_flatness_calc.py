@@ -16,6 +16,7 @@ pack_name = "noctilucence"
 pack_path = local_path[:local_path.index(pack_name) + len(pack_name)]
 sys.path.insert(0, pack_path)
 
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 
@@ -24,7 +25,7 @@ from animator import animation as ani
 from animator.scene import Scene
 from animator import funcs
 
-from animator.entities.primatives import Point, Line
+from animator.entities.primatives import Line
 
 
 
@@ -43,89 +44,72 @@ def calc_flatness(points, data=False):
         containing respectively the flatness, flatness line slope, lower point, 
         and upper point of each evaluated roll position in the calculation. """
     
+    # Only points on the convex hull can touch the flatness lines, so roll 
+    # around those alone; the flatness is unchanged. Ordered counterclockwise,
+    # and kept as separate contiguous x & y arrays.
+    hull = cv2.convexHull(points.astype(np.float32), returnPoints=False)[:, 0]
+    xs = points[hull, 0]
+    ys = points[hull, 1]
+    if np.sum(xs * np.roll(ys, -1) - np.roll(xs, -1) * ys) < 0: # clockwise
+        xs = xs[::-1].copy()
+        ys = ys[::-1].copy()
+    edge_xs = np.roll(xs, -1) - xs # edge from each hull point to the next
+    edge_ys = np.roll(ys, -1) - ys
+    
     # Extract two points with extreme y values; these will be used as initial
-    # starting points in the flatness search. 
-    n0 = np.argmin(points, axis=0)[1] # index of min y value
-    n1 = np.argmax(points, axis=0)[1] # index of max y value
-    p0 = points[n0] # Point with minimum y value
-    p1 = points[n1] # Point with maximum y value
-    
-    # Horizontal line -- original flatness line estimate
-    p0_slope = np.array([1, 0]) # unit vector with slope of flatness line
-    p1_slope = -p0_slope
-    
-    # Results to be tabulated from each roll position
-    flatness_step_vals = np.array([])
-    slope_vals = np.empty((0, 2))
-    p0_vals = np.empty((0, 2))
-    p1_vals = np.empty((0, 2))
-    
-    # Loop over all candidate flatness values by rolling around point set, 
-    # similar to string wrapping algorithm to find a convex hull.
-    # Stop when rolled around completely such that p0 equals the original p1 
-    # point or vice versa.
-    while (not np.array_equal(p0, points[n1])) and \
-          (not np.array_equal(p1, points[n0])): # Stop when rolled to other side
-        # Calculate normalized direction from current point to each other point.
-        p0_dirs = np.empty((0, 2)) # list of 2d unit vectors
-        p0_dot_prods = np.array([]) # list of normalized dot products, -1 to 1
-        p1_dirs = np.empty((0, 2)) # list of 2d unit vectors
-        p1_dot_prods = np.array([]) # list of normalized dot products, -1 to 1
-
-        # Calculate directions of p0 and p1 to each other point, and dot
-        # products of these directions with their current slopes.
-        for i in range(np.size(points, 0)):
-            point = points[i]
-            # Assess p0
-            if not np.array_equal(point, p0): # Don't assess existing p0
-                p0_dist = ((point[0] - p0[0]) ** 2 + (point[1] - p0[1]) ** 2) \
-                            ** .5
-                p0_dir = np.array([(point[0] - p0[0]) / p0_dist, 
-                                   (point[1] - p0[1]) / p0_dist])
-                p0_dirs = np.concatenate((p0_dirs, np.array([p0_dir])), axis=0)
-            else: # if point = p0
-                p0_dirs = np.concatenate((p0_dirs, np.array([[0, 0]])), axis=0)
-            p0_dot_prods = np.append(p0_dot_prods, np.dot(p0_slope, p0_dir))
-            
-            # Assess p1
-            if not np.array_equal(point, p1): # Don't assess existing p1
-                p1_dist = ((point[0] - p1[0]) ** 2 + (point[1] - p1[1]) ** 2) \
-                            ** .5
-                p1_dir = np.array([(point[0] - p1[0]) / p1_dist, 
-                                   (point[1] - p1[1]) / p1_dist])
-                p1_dirs = np.concatenate((p1_dirs, np.array([p1_dir])), axis=0)
-            else: # if point = p1
-                p1_dirs = np.concatenate((p1_dirs, np.array([[0, 0]])), axis=0)
-            p1_dot_prods = np.append(p1_dot_prods, np.dot(p1_slope, p1_dir))
-        
-        # Find which dot product is the largest, and update p0 or p1 to the new
-        # point (rolls onto it).
-        # Update slopes of the flatness lines.  
-        p0_max_dp = np.max(p0_dot_prods)
-        p0_max_dp_index = np.argmax(p0_dot_prods)
-        p1_max_dp = np.max(p1_dot_prods)
-        p1_max_dp_index = np.argmax(p1_dot_prods)
-        
-        if p0_max_dp >= p1_max_dp:
-            p0 = points[p0_max_dp_index]
-            p0_slope = p0_dirs[p0_max_dp_index]
-            p1_slope = -p0_slope
+    # starting points in the flatness search. Of those level with them, start
+    # where the next edge is horizontal, so the original line is evaluated.
+    n0 = int(np.lexsort((xs, ys))[0]) # min y, then min x
+    n1 = int(np.lexsort((-xs, -ys))[0]) # max y, then max x
+    i0, i1 = n0, n1 # indices of current p0 and p1
+    
+    # Indices of p0 & p1, & of the edge the lines lie along, at each roll 
+    # position. The edge is reversed (-1) if it is p1's.
+    i0_vals = []
+    i1_vals = []
+    edge_vals = []
+    edge_signs = []
+    
+    # Loop over all candidate flatness positions by rotating the parallel 
+    # lines around the hull (rotating calipers), starting horizontal. Each 
+    # step, one line rolls onto the next edge after its point, the one it is 
+    # turned by the least to reach. Only indices are tracked, on Python 
+    # scalars; the values at each position are calculated together after.
+    # Stop when rolled around completely, by half a turn, such that p0 equals 
+    # the original p1 point and vice versa.
+    ex = edge_xs.tolist()
+    ey = edge_ys.tolist()
+    n = len(ex)
+    while i0 != n1 or i1 != n0: # Stop when rolled to other side
+        # p0's line turns to its edge no later than p1's line turns to its 
+        # edge if p0's edge is counterclockwise of p1's reversed, i.e. their 
+        # cross product is not negative. 
+        # A line which has rolled to the other side stays there.
+        if i1 == n0 or (i0 != n1 and ex[i1] * ey[i0] - ey[i1] * ex[i0] >= 0):
+            edge_vals.append(i0)
+            edge_signs.append(1.)
+            i0 = (i0 + 1) % n
         else:
-            p1 = points[p1_max_dp_index]
-            p1_slope = p1_dirs[p1_max_dp_index]
-            p0_slope = -p1_slope
-        
-        # Report flatness from this step.
-        p01 = (p1 - p0) # vector from p0 to p1
-        flat_normal = np.array([-p0_slope[1], p0_slope[0]]) # rotate slope 90deg
-        flatness_step_val = abs(np.dot(p01, flat_normal))
-        
-        # Tabulate data
-        flatness_step_vals = np.append(flatness_step_vals, flatness_step_val)
-        slope_vals = np.concatenate((slope_vals, np.array([np.copy(p0_slope)])), 
-                axis=0)
-        p0_vals = np.concatenate((p0_vals, np.array([np.copy(p0)])), axis=0)
-        p1_vals = np.concatenate((p1_vals, np.array([np.copy(p1)])), axis=0)
+            edge_vals.append(i1)
+            edge_signs.append(-1.)
+            i1 = (i1 + 1) % n
+        i0_vals.append(i0)
+        i1_vals.append(i1)
+    
+    # Slope of flatness lines, as a unit vector along p0's line
+    edge_signs = np.array(edge_signs)
+    slope_xs = edge_xs[edge_vals]
+    slope_ys = edge_ys[edge_vals]
+    lengths = np.hypot(slope_xs, slope_ys)
+    slope_xs = edge_signs * (slope_xs / lengths)
+    slope_ys = edge_signs * (slope_ys / lengths)
+    
+    # Flatness at each step; separation of p0 & p1 normal to the lines
+    flatness_step_vals = np.abs((xs[i1_vals] - xs[i0_vals]) * -slope_ys + 
+                                (ys[i1_vals] - ys[i0_vals]) * slope_xs)
+    slope_vals = np.stack((slope_xs, slope_ys), axis=1)
+    p0_vals = np.stack((xs[i0_vals], ys[i0_vals]), axis=1)
+    p1_vals = np.stack((xs[i1_vals], ys[i1_vals]), axis=1)
         
     # Report flatness
     flatness = np.min(flatness_step_vals)
@@ -134,18 +118,19 @@ def calc_flatness(points, data=False):
     else:
         return flatness
 
-def plot_point(img, point, resolution, origin, color=[255, 255, 255]):
-    """ Plots the points specified on an image. 
+def plot_points(img, points, resolution, origin, color=[255, 255, 255]):
+    """ Plots the points specified on an image, drawn as Points would be. 
+    All are projected to pixels at once, without creating a Point for each. 
     
     Args:
         img: 3d Numpy array; image upon which points will be plotted
-        points: 2-element; coordinates of point to plot
+        points: 2d Numpy array; coordinates of points to plot
         resolution: px/mm; pixels on image per millimeter of entity size 
         origin: list [x_origin, y_origin] of image origin in pixels
-        color: list [blue, green, red], uint8); color of the plotted point
+        color: list [blue, green, red], uint8); color of the plotted points
     """
-    plotted_point = Point([point[0], point[1], 0], size=4, color=color)
-    plotted_point.draw_self(img, resolution, origin)
+    for center in funcs.to_pixels(points, resolution, origin).tolist():
+        cv2.circle(img, center, 4, color, thickness=-1, lineType=cv2.LINE_AA)
     
 def draw_line(img, point, slope, resolution, origin, color=[255, 255, 255]):
     """ Plots the line specified on an image. 
@@ -163,37 +148,72 @@ def draw_line(img, point, slope, resolution, origin, color=[255, 255, 255]):
     plotted_line.draw_self(img, resolution, origin)
     
 
-def draw_image(points, line_points_0, line_points_1, slopes):
-    """ Creates an image with the points and lines given. 
+def draw_points_image(points, resolution, origin):
+    """ Creates the background image of the animation, with only the points.
     
     Args:
         points: 2d Numpy array; list of points to plot
+        resolution: px/mm; pixels on image per millimeter of entity size 
+        origin: list [x_origin, y_origin] of image origin in pixels
+    
+    Returns:
+        Shape (1000, 1500, 3) Numpy array; bgr image of the points
+    """
+    img = np.zeros([1000, 1500, 3], np.uint8)  # blank bgr image
+    plot_points(img, points, resolution, origin)
+    return img
+
+def animate(img_points_only, line_points_0, line_points_1, slopes, 
+        resolution, origin):
+    """ Shows the lines given over the points image, one pair at a time, 
+    cycling forwards then backwards indefinitely. Each frame is rendered 
+    once, in parallel, before being shown. 
+    
+    Args:
+        img_points_only: 3d Numpy array; background image, see 
+                         draw_points_image. Not modified.
         line_points_0: 2d Numpy array; a point on the lower plotted lines
         line_points_1: 2d Numpy array; a point on the upper plotted lines
         slopes: 2d Numpy array; unit vectors on each of the plotted lines
+        resolution: px/mm; pixels on image per millimeter of entity size 
+        origin: list [x_origin, y_origin] of image origin in pixels
     """
+    def render_frame(i):
+        """ Returns the points image with the i-th pair of lines drawn. """
+        img_points_and_line = np.copy(img_points_only)
+        draw_line(img_points_and_line, line_points_0[i], slopes[i], 
+                resolution, origin, color=[0, 255, 0])
+        draw_line(img_points_and_line, line_points_1[i], slopes[i], 
+                resolution, origin, color=[0, 0, 255])
+        return img_points_and_line
     
-    img = np.zeros([1000, 1500, 3], np.uint8)  # blank bgr image
-    resolution = 5  # px / mm
-    origin = [500, 1000]
+    # Frames are independent, & cv2 releases the GIL while drawing
+    n = np.shape(line_points_0)[0]
+    with ThreadPoolExecutor() as executor:
+        frames = list(executor.map(render_frame, range(n)))
     
-    for point in points:
-        plot_point(img, point, resolution, origin)
+    while True: # Cycle image
+        for direction in (1, -1):
+            for i in range(n)[::direction]:
+                cv2.imshow('plot', frames[i])
+                cv2.waitKey(150)
+
+def draw_image(points, line_points_0, line_points_1, slopes):
+    """ Creates an image with the points and lines given, and animates it. 
+    The points are only plotted once. See animate
     
-    img_points_only = np.copy(img)
+    Args:
+        points: 2d Numpy array; list of points to plot
+        line_points_0: 2d Numpy array; a point on the lower plotted lines
+        line_points_1: 2d Numpy array; a point on the upper plotted lines
+        slopes: 2d Numpy array; unit vectors on each of the plotted lines
+    """
+    resolution = 5  # px / mm
+    origin = [500, 1000]
     
-    for i in range(np.shape(line_points_0)[0]):
-        img_points_and_line = np.copy(img_points_only)
-        draw_line(img_points_and_line, line_points_0[i], slopes[i], resolution, 
-                origin, color=[0, 255, 0])
-        draw_line(img_points_and_line, line_points_1[i], slopes[i], resolution, 
-                origin, color=[0, 0, 255])
-        cv2.imshow('plot', img_points_and_line)
-        cv2.waitKey(150)
-    # Cycle image: 
-    draw_image(points, np.flip(line_points_0, axis=0), 
-                       np.flip(line_points_1, axis=0),
-                       np.flip(slopes, axis=0))
+    img_points_only = draw_points_image(points, resolution, origin)
+    animate(img_points_only, line_points_0, line_points_1, slopes, 
+            resolution, origin)
     
 
 if __name__ == '__main__':
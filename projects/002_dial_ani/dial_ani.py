@@ -15,7 +15,6 @@ pack_name = "noctilucence"
 pack_path = local_path[:local_path.index(pack_name) + len(pack_name)]
 sys.path.insert(0, pack_path)
 
-import cv2
 import numpy as np
 
 import animator
@@ -27,8 +26,6 @@ from animator.entities.dial_indicator import *
 from animator.entities.primatives import P, Polygon
 from animator.entities.dimensions import Leader
 
-import csv
-
        
 
 def create_polygon(csv_file):
@@ -48,11 +45,9 @@ def create_polygon(csv_file):
     poly_points = [P([width + extension, -thickness, 0]), 
                    P([0 - extension, -thickness, 0])]
     
-    # Read file and append each point to polygon. 
-    with open("dial_ani_flatness_inputs.csv", 'r') as data_file:
-        csv_data = csv.reader(data_file)      
-        for row in csv_data:
-            poly_points.append(P([float(row[0]), float(row[1]), 0.]))
+    # Read file in one pass and append each point to polygon. 
+    point_data = np.loadtxt(csv_file, delimiter=',', ndmin=2)
+    poly_points.extend(P([x, y, 0.]) for x, y in point_data[:, :2].tolist())
     poly = Polygon(poly_points, color=[130, 180, 250], opacity=0)
     return poly
 
@@ -270,13 +265,8 @@ if __name__ == '__main__':
     
     # # # Write Animation # # #
     
-    out = cv2.VideoWriter('dial_ani.mp4', cv2.VideoWriter_fourcc(*'mp4v'), fps, 
-            (width, height))
-    frames = scene.get_frames()
     print("\nWriting Animation....")
-    for frame in frames:
-        out.write(frame)
-    out.release()
+    scene.write_video('dial_ani.mp4')
     print("....done\n")
 
     print("exiting")
@@ -15,7 +15,6 @@ pack_name = "noctilucence"
 pack_path = local_path[:local_path.index(pack_name) + len(pack_name)]
 sys.path.insert(0, pack_path)
 
-import cv2
 import numpy as np
 
 import animator
@@ -103,11 +102,6 @@ if __name__ == "__main__":
   
   
     # # # Write Animation # # #
-    out = cv2.VideoWriter('leader_test.mp4', cv2.VideoWriter_fourcc(*'mp4v'), 
-            fps, (width, height))
-    frames = scene.get_frames(status=False)
     print("\nWriting Animation....")
-    for frame in frames:
-        out.write(frame)
-    out.release()
+    scene.write_video('leader_test.mp4', status=False)
     print("....done\n")
\ No newline at end of file
@@ -16,7 +16,6 @@ pack_name = "noctilucence"
 pack_path = local_path[:local_path.index(pack_name) + len(pack_name)]
 sys.path.insert(0, pack_path)
 
-import cv2
 import numpy as np
 
 import animator
@@ -63,13 +62,8 @@ if __name__ == '__main__':
     
     # # # Write Animation # # #
     
-    out = cv2.VideoWriter('two_hole_align.mp4', 
-            cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
-    frames = scene.get_frames()
     print("\nWriting Animation....")
-    for frame in frames:
-        out.write(frame)
-    out.release()
+    scene.write_video('two_hole_align.mp4')
     print("....done\n")
 
     print("exiting")